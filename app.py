@@ -1,115 +1,172 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort
+from flask import Blueprint, Flask, Response, current_app, stream_with_context, render_template, request, redirect, url_for, flash, jsonify, abort
+from flask.cli import AppGroup, with_appcontext
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.exceptions import HTTPException
-from datetime import datetime, date
+from werkzeug.local import LocalProxy
+from datetime import datetime, timedelta
+import click
+import csv
+import io
 import json
+import math
 import os
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from models import *
-from database import db
+from database import db, init_database, pool_metrics, read_only
+from pageviews import PageViewBuffer, compact_page_views, page_views
+from catalog import MenuCatalog, menu_catalog, ITEM_FIELDS
+from querycount import query_budget
+from pagination import changes_since, decode_cursor, keyset_page, resume_cursor
+from migrations import SCHEMA_VERSION, ensure_columns, ensure_indexes, schema_version, set_schema_version
+import order_status
+import stats
+from notifications import AdminRecipients, admin_recipients
+from identity import UserIdentityCache, user_cache
+from fragments import FragmentCache
+from assets import AssetManifest, assets, build_assets
+from credentials import CredentialService, PasswordHashingBusy, credentials
+from metrics import RequestMetrics
+from serializers import (ADMIN_ORDER, ADMIN_ORDER_SUMMARY, ORDER_ITEM, ORDER_SUMMARY,
+                         USER_ORDER, install_json_provider)
+from realtime import create_event_bus, event_stream
 
-# Для WebSocket (используем простой polling для Render.com)
-import threading
-import time
-from collections import defaultdict
+# Представления приложения; собирается оно фабрикой create_app(). Импорт
+# модуля не создает приложение и не обращается к базе: схему и тестовые
+# данные готовит `flask init-db` (см. init_db и bootstrap_db)
+bp = Blueprint('main', __name__)
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'restaurant-management-secret-key-2024')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///restaurant.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Инициализация базы данных
-db.init_app(app)
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
+
+# Шина событий текущего приложения (polling для Render.com)
+event_bus = LocalProxy(lambda: current_app.extensions['event_bus'])
+
+def create_app(config=None):
+    """Создать приложение. config - настройки поверх переменных окружения"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'restaurant-management-secret-key-2024')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///restaurant.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Размер страницы списка заказов администратора
+    app.config['ADMIN_ORDERS_PAGE_SIZE'] = int(os.environ.get('ADMIN_ORDERS_PAGE_SIZE', 50))
+    # Опрос изменений заказов по курсору since: не больше строк за ответ и
+    # перекрытие в секундах для транзакций, закоммиченных не по порядку
+    app.config['ORDER_CHANGES_LIMIT'] = int(os.environ.get('ORDER_CHANGES_LIMIT', 200))
+    app.config['ORDER_CHANGES_OVERLAP'] = float(os.environ.get('ORDER_CHANGES_OVERLAP', 2))
+    # Сколько заказов можно изменить одним пакетным запросом смены статуса
+    app.config['ORDER_STATUS_BATCH_LIMIT'] = int(os.environ.get('ORDER_STATUS_BATCH_LIMIT', 500))
+    # Проверка лимитов SQL-запросов в представлениях (см. querycount.query_budget)
+    app.config['QUERY_BUDGET_CHECK'] = os.environ.get('QUERY_BUDGET_CHECK') == '1'
+    # Метрики на /metrics (см. metrics.py); Server-Timing - для отладки
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_SERVER_TIMING'] = os.environ.get('METRICS_SERVER_TIMING') == '1'
+    app.config['SLOW_QUERY_THRESHOLD'] = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.5))
+    # Параметры хеширования паролей (см. credentials.py)
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    if config:
+        app.config.update(config)
 
-# Хранилище для обновлений в реальном времени
-realtime_updates = defaultdict(list)
-update_lock = threading.Lock()
+    # Инициализация базы данных (профиль движка: DATABASE_PROFILE, см. database.py)
+    init_database(app)
+    # Расширения с состоянием (кэши, буферы, пулы) создаются для каждого
+    # приложения и лежат в app.extensions; page_views, menu_catalog и другие
+    # имена модулей - прокси к расширениям текущего приложения.
+    # Метрики первыми, чтобы замер времени охватывал остальные обработчики запроса
+    request_metrics = RequestMetrics(app)
+    login_manager.init_app(app)
+    app_page_views = PageViewBuffer(app)
+    MenuCatalog(app)
+    app_user_cache = UserIdentityCache(app)
+    CredentialService(app)
+    app_fragment_cache = FragmentCache(app)
+    AssetManifest(app)
+    AdminRecipients(app)
+    install_json_provider(app)
+    create_event_bus(app)
+
+    request_metrics.add_source('db_pool', pool_metrics)
+    request_metrics.add_source('pageviews', app_page_views.stats)
+    request_metrics.add_source('user_cache', app_user_cache.stats)
+    request_metrics.add_source('fragment_cache', app_fragment_cache.stats)
+
+    app.register_blueprint(bp)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(pageviews_cli)
+    app.cli.add_command(assets_cli)
+    return app
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Снимок пользователя из кэша, без запроса к БД на каждый запрос
+    return user_cache.get(int(user_id))
 
 def add_realtime_update(user_id, update_type, data):
     """Добавить обновление для пользователя"""
-    with update_lock:
-        realtime_updates[user_id].append({
-            'type': update_type,
-            'data': data,
-            'timestamp': datetime.now().isoformat()
-        })
-        # Храним только последние 100 обновлений
-        if len(realtime_updates[user_id]) > 100:
-            realtime_updates[user_id] = realtime_updates[user_id][-100:]
+    return event_bus.publish(user_id, update_type, data)
 
-def get_realtime_updates(user_id, last_timestamp=None):
+def get_realtime_updates(user_id, last_timestamp=None, cursor=None):
     """Получить новые обновления для пользователя"""
-    with update_lock:
-        if user_id not in realtime_updates:
-            return []
-        
-        if last_timestamp:
-            updates = [u for u in realtime_updates[user_id] 
-                      if u['timestamp'] > last_timestamp]
-        else:
-            # Возвращаем последние 10 обновлений
-            updates = realtime_updates[user_id][-10:]
-        
-        return updates
+    if cursor is not None:
+        return event_bus.read(user_id, after=cursor)
+
+    if last_timestamp:
+        # Старые клиенты передают время последнего опроса вместо курсора
+        return [u for u in event_bus.read(user_id, after=0)
+                if u['timestamp'] > last_timestamp]
+
+    # Возвращаем последние 10 обновлений
+    return event_bus.read(user_id, limit=10)
 
 # Middleware для отслеживания просмотров страниц
-@app.before_request
+@bp.before_app_request
 def track_page_view():
-    if current_user.is_authenticated and request.endpoint not in ['static']:
-        try:
-            view = PageView(
-                user_id=current_user.id,
-                page_url=request.path,
-                viewed_at=datetime.utcnow(),
-                ip_address=request.remote_addr
-            )
-            db.session.add(view)
-            db.session.commit()
-        except:
-            db.session.rollback()
+    if page_views.should_track(request.endpoint) and current_user.is_authenticated:
+        page_views.record(
+            user_id=current_user.id,
+            page_url=request.path,
+            ip_address=request.remote_addr
+        )
 
 # Вспомогательная функция для перевода статусов
-@app.context_processor
+STATUS_TEXTS = {
+    'pending': 'Ожидает обработки',
+    'preparing': 'Готовится',
+    'ready': 'Готов к выдаче',
+    'delivered': 'Доставлен',
+    'cancelled': 'Отменен'
+}
+
+def get_status_text(status):
+    return STATUS_TEXTS.get(status, status)
+
+@bp.app_context_processor
 def utility_processor():
-    def get_status_text(status):
-        status_map = {
-            'pending': 'Ожидает обработки',
-            'preparing': 'Готовится',
-            'ready': 'Готов к выдаче',
-            'delivered': 'Доставлен',
-            'cancelled': 'Отменен'
-        }
-        return status_map.get(status, status)
     return dict(get_status_text=get_status_text)
 
 # Обработчики ошибок
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(400)
+@bp.app_errorhandler(400)
 def bad_request_error(error):
     return render_template('errors/400.html'), 400
 
-@app.errorhandler(403)
+@bp.app_errorhandler(403)
 def forbidden_error(error):
     return render_template('errors/403.html'), 403
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('errors/500.html'), 500
 
 # Главная страница
-@app.route('/')
+@bp.route('/')
 def index():
     slider_items = [
         {'image': 'slide1.jpg', 'title': 'Добро пожаловать', 'description': 'Лучшие блюда от шеф-повара'},
@@ -129,14 +186,15 @@ def index():
                          info_blocks=info_blocks)
 
 # Страница меню
-@app.route('/menu')
+@bp.route('/menu')
 def menu():
-    categories = Category.query.all()
-    menu_items = MenuItem.query.filter_by(is_available=True).all()
-    return render_template('menu.html', categories=categories, menu_items=menu_items)
+    catalog = menu_catalog.get()
+    # ETag снимка меняется вместе с содержимым меню: это версия фрагментов
+    return render_template('menu.html', categories=catalog.categories,
+                           menu_version=catalog.etag)
 
 # Страница заказа
-@app.route('/order', methods=['GET', 'POST'])
+@bp.route('/order', methods=['GET', 'POST'])
 @login_required
 def order():
     if request.method == 'POST':
@@ -149,20 +207,35 @@ def order():
             if not cart_items:
                 return jsonify({'error': 'Корзина пуста'}), 400
             
+            # Одинаковые позиции корзины объединяем
+            quantities = {}
+            for item in cart_items:
+                try:
+                    item_id, quantity = int(item['id']), int(item['quantity'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if quantity > 0:
+                    quantities[item_id] = quantities.get(item_id, 0) + quantity
+            
+            # Все блюда заказа одним запросом
+            menu_items = {}
+            if quantities:
+                menu_items = {m.id: m for m in MenuItem.query.filter(MenuItem.id.in_(quantities)).all()}
+            
             total_amount = 0
             order_items_data = []
             
-            for item in cart_items:
-                menu_item = MenuItem.query.get(item['id'])
+            for item_id, quantity in quantities.items():
+                menu_item = menu_items.get(item_id)
                 if not menu_item:
                     continue
                     
-                item_total = menu_item.price * item['quantity']
+                item_total = menu_item.price * quantity
                 total_amount += item_total
                 
                 order_items_data.append({
-                    'menu_item': menu_item,
-                    'quantity': item['quantity'],
+                    'menu_item_id': menu_item.id,
+                    'quantity': quantity,
                     'price_at_time': menu_item.price
                 })
             
@@ -181,37 +254,36 @@ def order():
             db.session.add(order)
             db.session.flush()
             
+            # Позиции заказа одним INSERT
+            order_id = order.id
             for item_data in order_items_data:
-                order_item = OrderItem(
-                    order_id=order.id,
-                    menu_item_id=item_data['menu_item'].id,
-                    quantity=item_data['quantity'],
-                    price_at_time=item_data['price_at_time']
-                )
-                db.session.add(order_item)
+                item_data['order_id'] = order_id
+            db.session.execute(insert(OrderItem), order_items_data)
             
+            stats.record_order_created(order)
+            # После commit объекты сессии истекают, значения нужны заранее
+            user_id, username = current_user.id, current_user.username
             db.session.commit()
             
             # Отправляем уведомления в реальном времени
-            add_realtime_update(current_user.id, 'new_order', {
-                'order_id': order.id,
+            add_realtime_update(user_id, 'new_order', {
+                'order_id': order_id,
                 'total_amount': total_amount,
                 'status': 'pending'
             })
             
             # Администраторы также получают уведомления
-            admins = User.query.filter_by(role='admin').all()
-            for admin in admins:
-                add_realtime_update(admin.id, 'new_order_admin', {
-                    'order_id': order.id,
-                    'user_id': current_user.id,
-                    'username': current_user.username,
+            for admin_id in admin_recipients.get():
+                add_realtime_update(admin_id, 'new_order_admin', {
+                    'order_id': order_id,
+                    'user_id': user_id,
+                    'username': username,
                     'total_amount': total_amount
                 })
             
             return jsonify({
                 'success': True, 
-                'order_id': order.id,
+                'order_id': order_id,
                 'total_amount': total_amount
             })
             
@@ -220,30 +292,103 @@ def order():
             print(f"Ошибка при создании заказа: {str(e)}")
             return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
     
-    menu_items = MenuItem.query.filter_by(is_available=True).all()
-    return render_template('order.html', menu_items=menu_items)
+    # Шаблон меню не использует: корзина (название, цена, количество) берется
+    # из localStorage через getCartData() в static/js/script.js
+    return render_template('order.html')
 
 # История заказов
-@app.route('/profile/orders')
+@bp.route('/profile/orders')
 @login_required
+@query_budget(4)
 def user_orders():
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
-    return render_template('profile.html', orders=orders)
+    # Версия истории заказов: последнее изменение и число заказов (индекс user_id, updated_at)
+    orders_version = tuple(db.session.execute(
+        select(func.max(Order.updated_at), func.count(Order.id))
+        .where(Order.user_id == current_user.id)
+    ).one())
+    # В заказах показаны названия блюд, поэтому ключ зависит и от меню. Номер
+    # версии каталога меняется и при правке снятых с продажи блюд, которых
+    # нет в ETag (снимок меню пересобирается раз в MENU_CACHE_TTL: +1 запрос)
+    catalog = menu_catalog.get()
+    menu_version = (catalog.version, catalog.etag)
+    
+    def load_orders():
+        return Order.query.filter_by(user_id=current_user.id)\
+                          .options(selectinload(Order.items).joinedload(OrderItem.menu_item))\
+                          .order_by(Order.created_at.desc()).all()
+    
+    return render_template('profile.html', orders_version=orders_version,
+                           menu_version=menu_version, load_orders=load_orders)
 
 # API для получения обновлений в реальном времени
-@app.route('/api/realtime/updates')
+@bp.route('/api/realtime/updates')
 @login_required
 def get_realtime_updates_api():
     last_timestamp = request.args.get('last_timestamp')
-    updates = get_realtime_updates(current_user.id, last_timestamp)
+    cursor = request.args.get('cursor', type=int)
+    updates = get_realtime_updates(current_user.id, last_timestamp, cursor)
     return jsonify({
         'updates': updates,
+        'cursor': updates[-1]['id'] if updates else (cursor or event_bus.last_id(current_user.id)),
         'timestamp': datetime.now().isoformat()
     })
 
+def get_last_event_id():
+    """Курсор клиента: заголовок Last-Event-ID при переподключении или ?cursor="""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    try:
+        return int(last_event_id)
+    except (TypeError, ValueError):
+        return None
+
+# Поток Server-Sent Events с обновлениями для пользователя
+@bp.route('/api/realtime/stream')
+@login_required
+def realtime_stream():
+    user_id = current_user.id
+    cursor = get_last_event_id()
+    if cursor is None:
+        cursor = event_bus.last_id(user_id)
+    # Соединение с БД не нужно на все время жизни потока
+    db.session.remove()
+
+    # Поток читается после завершения запроса, без контекста приложения
+    stream = event_stream(
+        event_bus._get_current_object(), user_id, cursor,
+        heartbeat=current_app.config['REALTIME_HEARTBEAT'],
+        timeout=current_app.config['REALTIME_STREAM_TIMEOUT']
+    )
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Long-poll: ответ приходит при появлении события или по таймауту
+@bp.route('/api/realtime/poll')
+@login_required
+def realtime_poll():
+    user_id = current_user.id
+    cursor = get_last_event_id()
+    if cursor is None:
+        cursor = event_bus.last_id(user_id)
+    max_timeout = current_app.config['REALTIME_LONGPOLL_TIMEOUT']
+    timeout = request.args.get('timeout', max_timeout, type=float)
+    # nan и inf проходят сравнения в min/max, и ожидание не кончилось бы никогда
+    if not math.isfinite(timeout):
+        return jsonify({'error': 'Некорректный параметр timeout'}), 400
+    timeout = min(max(timeout, 0), max_timeout)
+    db.session.remove()
+
+    updates = event_bus.wait(user_id, cursor, timeout)
+    return jsonify({
+        'updates': updates,
+        'cursor': updates[-1]['id'] if updates else cursor
+    })
+
 # API для проверки новых заказов
-@app.route('/api/orders/check_new')
+@bp.route('/api/orders/check_new')
 @login_required
+@read_only
 def check_new_orders():
     # Проверяем новые заказы с момента последней проверки
     last_check = request.args.get('last_check')
@@ -274,39 +419,28 @@ def check_new_orders():
     })
 
 # API для получения последних заказов
-@app.route('/api/orders/latest')
+@bp.route('/api/orders/latest')
 @login_required
+@read_only
+@query_budget(1)
 def get_latest_orders():
     limit = int(request.args.get('limit', 10))
     
     if current_user.role == 'admin':
-        orders = Order.query.order_by(Order.created_at.desc()).limit(limit).all()
+        schema = ADMIN_ORDER_SUMMARY
+        query = db.session.query(*schema.columns()).join(User, Order.user_id == User.id)
     else:
-        orders = Order.query.filter_by(user_id=current_user.id)\
-                           .order_by(Order.created_at.desc()).limit(limit).all()
-    
-    result = []
-    for order in orders:
-        order_data = {
-            'id': order.id,
-            'total_amount': order.total_amount,
-            'status': order.status,
-            'created_at': order.created_at.strftime('%d.%m.%Y %H:%M'),
-            'items_count': len(order.items)
-        }
-        
-        if current_user.role == 'admin':
-            order_data['username'] = order.user.username
-        
-        result.append(order_data)
+        schema = ORDER_SUMMARY
+        query = db.session.query(*schema.columns()).filter(Order.user_id == current_user.id)
     
-    return jsonify(result)
+    rows = query.order_by(Order.created_at.desc()).limit(limit).all()
+    return jsonify(schema.dump_rows(rows))
 
 # Регистрация
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     if request.method == 'POST':
         username = request.form.get('username')
@@ -324,34 +458,50 @@ def register():
         if password != confirm_password:
             errors.append('Пароли не совпадают')
         
-        if User.query.filter_by(username=username).first():
-            errors.append('Пользователь с таким именем уже существует')
-        if User.query.filter_by(email=email).first():
-            errors.append('Пользователь с таким email уже существует')
+        # Имя и email одним запросом по уникальным индексам
+        if username and email:
+            for existing_username, existing_email in db.session.execute(
+                select(User.username, User.email)
+                .where(or_(User.username == username, User.email == email))
+                .limit(2)
+            ):
+                if existing_username == username:
+                    errors.append('Пользователь с таким именем уже существует')
+                if existing_email == email:
+                    errors.append('Пользователь с таким email уже существует')
+        
+        if not errors:
+            try:
+                user = User(
+                    username=username,
+                    email=email,
+                    password=credentials.hash_password(password),
+                    role='customer'
+                )
+                db.session.add(user)
+                db.session.commit()
+            except PasswordHashingBusy:
+                flash('Сервер перегружен, попробуйте еще раз через несколько секунд', 'danger')
+                return render_template('register.html'), 503
+            except IntegrityError:
+                # Такой же пользователь зарегистрировался между проверкой и INSERT
+                db.session.rollback()
+                errors.append('Пользователь с таким именем или email уже существует')
         
         if errors:
             for error in errors:
                 flash(error, 'danger')
         else:
-            user = User(
-                username=username,
-                email=email,
-                password=generate_password_hash(password),
-                role='customer'
-            )
-            db.session.add(user)
-            db.session.commit()
-            
             flash('Регистрация прошла успешно! Теперь вы можете войти.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
     
     return render_template('register.html')
 
 # Вход
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     if request.method == 'POST':
         username = request.form.get('username')
@@ -360,238 +510,479 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = credentials.verify(user, password or '')
+        except PasswordHashingBusy:
+            flash('Сервер перегружен, попробуйте войти через несколько секунд', 'danger')
+            return render_template('login.html'), 503
+        
+        if valid:
+            # Хеш с устаревшими параметрами credentials.verify уже пересчитал
+            if db.session.is_modified(user):
+                db.session.commit()
             login_user(user, remember=bool(remember))
             flash('Вход выполнен успешно!', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('.index'))
         else:
             flash('Неверное имя пользователя или пароль', 'danger')
     
     return render_template('login.html')
 
 # Выход
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
     flash('Вы вышли из системы', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 # API для получения меню
-@app.route('/api/menu')
+@bp.route('/api/menu')
+@read_only
 def api_menu():
-    categories = Category.query.all()
-    menu_items = MenuItem.query.filter_by(is_available=True).all()
-    
-    result = []
-    for category in categories:
-        category_data = {
-            'id': category.id,
-            'name': category.name,
-            'description': category.description,
-            'items': []
-        }
-        
-        for item in menu_items:
-            if item.category_id == category.id:
-                category_data['items'].append({
-                    'id': item.id,
-                    'name': item.name,
-                    'description': item.description,
-                    'price': item.price,
-                    'image': item.image
-                })
-        
-        if category_data['items']:
-            result.append(category_data)
-    
-    return jsonify(result)
+    catalog = menu_catalog.get()
+    payload, etag = catalog.payload, catalog.etag
+
+    # ?category=1,2 — только эти категории, ?fields=id,name,price — только эти поля блюд
+    category_param = request.args.get('category')
+    fields_param = request.args.get('fields')
+    if category_param or fields_param:
+        try:
+            category_ids = {int(c) for c in category_param.split(',') if c} if category_param else None
+        except ValueError:
+            return jsonify({'error': 'Некорректный параметр category'}), 400
+
+        fields = tuple(f for f in (fields_param or '').split(',') if f) or ITEM_FIELDS
+        unknown = [f for f in fields if f not in ITEM_FIELDS]
+        if unknown:
+            return jsonify({'error': f'Неизвестные поля: {", ".join(unknown)}'}), 400
+
+        payload, etag = catalog.variant(category_ids, fields)
+
+    response = Response(payload, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = catalog.last_modified
+    # Клиент всегда перепроверяет меню, но получает 304 без тела, если оно не менялось
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 # API для получения обновленных заказов пользователя
-@app.route('/api/user/orders/update')
+# (?since=<X-Changes-Cursor> - только заказы, измененные после курсора)
+@bp.route('/api/user/orders/update')
 @login_required
+@read_only
+@query_budget(2)
 def api_user_orders_update():
-    orders = Order.query.filter_by(user_id=current_user.id)\
-                       .order_by(desc(Order.created_at))\
-                       .limit(20)\
-                       .all()
-    
-    result = []
-    for order in orders:
-        order_data = {
-            'id': order.id,
-            'total_amount': order.total_amount,
-            'status': order.status,
-            'created_at': order.created_at.strftime('%d.%m.%Y %H:%M'),
-            'delivery_address': order.delivery_address,
-            'phone': order.phone,
-            'items_count': len(order.items),
-            'items': []
-        }
-        
-        for item in order.items[:5]:
-            order_data['items'].append({
-                'name': item.menu_item.name,
-                'quantity': item.quantity,
-                'price': item.price_at_time
-            })
-        
-        result.append(order_data)
+    # Лишняя колонка updated_at в конце строки нужна только для курсора
+    query = db.session.query(*USER_ORDER.columns(), Order.updated_at)\
+                      .filter(Order.user_id == current_user.id)
+    
+    since = decode_cursor(request.args.get('since'))
+    if since is not None:
+        rows, cursor = order_changes(query, since)
+        if not rows:
+            return changes_response(None, cursor)
+    else:
+        rows = query.order_by(desc(Order.created_at)).limit(20).all()
+        cursor = latest_change_cursor(rows)
+    
+    result = USER_ORDER.dump_rows(rows)
+    items = load_order_items([order['id'] for order in result], per_order=5)
+    for order in result:
+        order['items'] = items.get(order['id'], [])
+    
+    return changes_response(result, cursor)
+
+def order_changes(query, since):
+    """Заказы, созданные или измененные после курсора since"""
+    return changes_since(query, Order.updated_at, Order.id, since,
+                         current_app.config['ORDER_CHANGES_LIMIT'], order_changes_overlap())
+
+def latest_change_cursor(rows):
+    """Курсор since для полного списка: последнее изменение среди его строк"""
+    if not rows:
+        return None
+    return resume_cursor(max((row.updated_at, row.id) for row in rows), order_changes_overlap())
+
+def order_changes_overlap():
+    return timedelta(seconds=current_app.config['ORDER_CHANGES_OVERLAP'])
+
+def changes_response(result, cursor):
+    """Ответ API обновлений с курсором в X-Changes-Cursor.
+    
+    result = None означает, что изменений нет: ответ 204 без тела.
+    """
+    response = current_app.response_class(status=204) if result is None else jsonify(result)
+    if cursor:
+        response.headers['X-Changes-Cursor'] = cursor
+    return response
+
+def load_order_items(order_ids, per_order=None):
+    """Позиции нескольких заказов одним запросом: {order_id: [item, ...]}"""
+    if not order_ids:
+        return {}
+    
+    rows = db.session.query(OrderItem.order_id, *ORDER_ITEM.columns())\
+                     .join(MenuItem, OrderItem.menu_item_id == MenuItem.id)\
+                     .filter(OrderItem.order_id.in_(order_ids))\
+                     .order_by(OrderItem.order_id, OrderItem.id)\
+                     .all()
+    
+    dump = ORDER_ITEM.dump
+    items = {}
+    for order_id, *item in rows:
+        order_items = items.setdefault(order_id, [])
+        if per_order is None or len(order_items) < per_order:
+            order_items.append(dump(item))
+    return items
+
+def filter_orders(query, status_filter=None, date_filter=None):
+    """Фильтры списка заказов администратора по статусу и дате (YYYY-MM-DD)"""
+    if status_filter and status_filter != 'all':
+        query = query.filter(Order.status == status_filter)
+    
+    if date_filter:
+        try:
+            day_start = datetime.strptime(date_filter, '%Y-%m-%d')
+            # Диапазон вместо func.date(), чтобы работал индекс по created_at
+            query = query.filter(Order.created_at >= day_start,
+                                 Order.created_at < day_start + timedelta(days=1))
+        except ValueError:
+            pass
     
-    return jsonify(result)
+    return query
 
 # Панель администратора (просмотр заказов)
-@app.route('/admin/orders')
+@bp.route('/admin/orders')
 @login_required
+@query_budget(2)
 def admin_orders():
     if current_user.role != 'admin':
         abort(403)
     
-    orders = Order.query.order_by(desc(Order.created_at)).all()
-    return render_template('admin/orders.html', orders=orders)
+    before = request.args.get('before')
+    orders, next_cursor = keyset_page(
+        Order.query.options(joinedload(Order.user)),
+        Order.created_at, Order.id,
+        decode_cursor(before), current_app.config['ADMIN_ORDERS_PAGE_SIZE']
+    )
+    order_stats = stats.snapshot()
+    return render_template('admin/orders.html', orders=orders,
+                           before=before, next_cursor=next_cursor,
+                           page_size=current_app.config['ADMIN_ORDERS_PAGE_SIZE'],
+                           total_orders=order_stats['total_orders'],
+                           total_amount=order_stats['total_revenue'])
 
 # API для администратора - получение обновленных заказов
-@app.route('/api/admin/orders/update')
+# (?since=<X-Changes-Cursor> - только изменения первой страницы)
+@bp.route('/api/admin/orders/update')
 @login_required
+@read_only
+@query_budget(1)
 def api_admin_orders_update():
     if current_user.role != 'admin':
         abort(403)
     
-    status_filter = request.args.get('status', 'all')
-    date_filter = request.args.get('date', None)
+    query = db.session.query(*ADMIN_ORDER.columns(), Order.updated_at)\
+                      .join(User, Order.user_id == User.id)
+    before = request.args.get('before')
+    since = decode_cursor(request.args.get('since'))
     
-    query = Order.query
+    if since is not None and not before:
+        # Изменения первой страницы. Фильтр по статусу не применяется:
+        # клиент сам убирает заказы, которые перестали ему соответствовать
+        rows, cursor = order_changes(filter_orders(query, 'all', request.args.get('date')), since)
+        return changes_response(ADMIN_ORDER.dump_rows(rows) if rows else None, cursor)
     
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
+    query = filter_orders(query,
+                          request.args.get('status', 'all'),
+                          request.args.get('date', None))
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    rows, next_cursor = keyset_page(query, Order.created_at, Order.id,
+                                    decode_cursor(before), limit)
     
-    if date_filter:
-        try:
-            filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            query = query.filter(func.date(Order.created_at) == filter_date)
-        except ValueError:
-            pass
+    response = changes_response(ADMIN_ORDER.dump_rows(rows), latest_change_cursor(rows))
+    # Курсор следующей страницы: ?before=<X-Next-Cursor>
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# Выгрузка заказов в CSV потоком, без загрузки всей таблицы в память
+@bp.route('/admin/orders/export.csv')
+@login_required
+def admin_orders_export():
+    if current_user.role != 'admin':
+        abort(403)
     
-    orders = query.order_by(desc(Order.created_at)).limit(50).all()
+    query = filter_orders(
+        select(Order.id, User.username, Order.created_at, Order.status,
+               Order.total_amount, Order.delivery_address, Order.phone, Order.notes)
+        .join(User, Order.user_id == User.id),
+        request.args.get('status', 'all'),
+        request.args.get('date', None)
+    ).order_by(desc(Order.created_at), desc(Order.id))
     
-    result = []
-    for order in orders:
-        address = order.delivery_address
-        if address and len(address) > 50:
-            address = address[:50] + '...'
-            
-        result.append({
-            'id': order.id,
-            'username': order.user.username,
-            'total_amount': order.total_amount,
-            'status': order.status,
-            'created_at': order.created_at.strftime('%d.%m.%Y %H:%M'),
-            'delivery_address': address,
-            'phone': order.phone
-        })
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['id', 'username', 'created_at', 'status', 'total_amount',
+                         'delivery_address', 'phone', 'notes'])
+        rows = db.session.execute(query.execution_options(yield_per=500))
+        for partition in rows.partitions():
+            for row in partition:
+                writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
     
-    return jsonify(result)
+    return Response(stream_with_context(generate()), mimetype='text/csv', headers={
+        'Content-Disposition': 'attachment; filename=orders.csv'
+    })
 
 # API для получения статистики
-@app.route('/api/admin/stats')
+@bp.route('/api/admin/stats')
 @login_required
+@read_only
+@query_budget(1)
 def api_admin_stats():
     if current_user.role != 'admin':
         abort(403)
     
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    today_orders = Order.query.filter(func.date(Order.created_at) == date.today()).count()
-    total_revenue = db.session.query(func.sum(Order.total_amount)).scalar() or 0
+    return jsonify(stats.snapshot())
+
+# Пересчет статистики по таблице заказов
+@bp.route('/api/admin/stats/rebuild', methods=['POST'])
+@login_required
+def api_admin_stats_rebuild():
+    if current_user.role != 'admin':
+        abort(403)
+    
+    stats.rebuild()
+    return jsonify(stats.snapshot())
+
+# Метрики пула соединений с базой данных
+@bp.route('/api/admin/db/pool')
+@login_required
+def api_admin_db_pool():
+    if current_user.role != 'admin':
+        abort(403)
     
     return jsonify({
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'today_orders': today_orders,
-        'total_revenue': float(total_revenue)
+        'profile': current_app.config['DATABASE_PROFILE'],
+        'engines': pool_metrics()
     })
 
 # Обновление статуса заказа
-@app.route('/admin/order/<int:order_id>/status', methods=['POST'])
+@bp.route('/admin/order/<int:order_id>/status', methods=['POST'])
 @login_required
 def update_order_status(order_id):
     if current_user.role != 'admin':
         abort(403)
     
-    order = Order.query.get_or_404(order_id)
-    new_status = request.json.get('status')
+    try:
+        changed = order_status.change_status(order_id, request.json.get('status'))
+    except order_status.OrderNotFound:
+        abort(404)
+    except order_status.StatusConflict as e:
+        return jsonify({'error': e.message}), 409
+    except order_status.OrderStatusError as e:
+        return jsonify({'error': e.message}), 400
     
-    if new_status in ['pending', 'preparing', 'ready', 'delivered', 'cancelled']:
-        order.status = new_status
-        db.session.commit()
-        
-        # Отправляем уведомление пользователю
-        add_realtime_update(order.user_id, 'order_status_changed', {
-            'order_id': order.id,
-            'status': new_status,
-            'status_text': get_status_text(new_status)
-        })
-        
-        return jsonify({'success': True})
+    if changed:
+        publish_status_changes([changed])
+    return jsonify({'success': True})
+
+# Пакетное обновление статусов: {"changes": [{"order_id": 1, "status": "ready"}, ...],
+# "partial": false}. Без partial при любой ошибке не меняется ни один заказ
+@bp.route('/admin/orders/status', methods=['POST'])
+@login_required
+def update_order_statuses():
+    if current_user.role != 'admin':
+        abort(403)
     
-    return jsonify({'error': 'Invalid status'}), 400
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes')
+    if not isinstance(changes, list) or not changes:
+        return jsonify({'error': 'Не переданы изменения'}), 400
+    if len(changes) > current_app.config['ORDER_STATUS_BATCH_LIMIT']:
+        return jsonify({'error': f"Не больше {current_app.config['ORDER_STATUS_BATCH_LIMIT']} заказов за раз"}), 400
+    try:
+        pairs = [(int(change['order_id']), change['status']) for change in changes]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Неверный формат изменений'}), 400
+    
+    changed, errors = order_status.change_statuses(pairs, partial=bool(data.get('partial')))
+    publish_status_changes(changed)
+    
+    status_code = 200
+    if errors and not changed:
+        conflict = any(isinstance(e, order_status.StatusConflict) for e in errors)
+        status_code = 409 if conflict else 400
+    return jsonify({
+        'success': not errors,
+        'updated': [change['order_id'] for change in changed],
+        'errors': [{'order_id': e.order_id, 'error': e.message} for e in errors]
+    }), status_code
+
+def publish_status_changes(changed):
+    """Уведомить пользователей о смене статусов одной пачкой событий"""
+    event_bus.publish_many([
+        (change['user_id'], 'order_status_changed', {
+            'order_id': change['order_id'],
+            'status': change['status'],
+            'status_text': get_status_text(change['status'])
+        })
+        for change in changed
+    ])
+
+# Команды flask stats ...
+stats_cli = AppGroup('stats', help='Статистика заказов')
+
+@stats_cli.command('rebuild')
+def stats_rebuild_command():
+    """Пересчитать статистику заказов с нуля"""
+    groups = stats.rebuild()
+    print(f"Статистика пересчитана: {groups} групп (день, статус)")
+
+# Команды flask pageviews ... (удобно запускать по расписанию, например cron)
+pageviews_cli = AppGroup('pageviews', help='Просмотры страниц')
+
+@pageviews_cli.command('compact')
+@click.option('--days', type=int, default=None,
+              help='Сворачивать просмотры старше N дней (PAGEVIEW_RETENTION_DAYS)')
+@click.option('--batch-size', type=int, default=1000, show_default=True,
+              help='Строк в одной транзакции')
+@click.option('--archive', 'archive_path', default=None,
+              help='Дописать удаляемые строки в CSV-файл (.csv.gz - со сжатием)')
+@click.option('--pause', type=float, default=0.0, show_default=True,
+              help='Пауза между пачками, секунды')
+def pageviews_compact_command(days, batch_size, archive_path, pause):
+    """Свернуть старые просмотры в дневную статистику и удалить их"""
+    if days is None:
+        days = current_app.config['PAGEVIEW_RETENTION_DAYS']
+    result = compact_page_views(days, batch_size=batch_size,
+                                archive_path=archive_path, pause=pause)
+    print(f"Свернуто просмотров до {result['cutoff']}: {result['compacted']} "
+          f"(групп: {result['groups']}, пачек: {result['batches']})")
+
+# Команды flask assets ... (запускать при деплое, до старта воркеров)
+assets_cli = AppGroup('assets', help='Статические файлы')
 
-# Инициализация базы данных
+@assets_cli.command('build')
+@click.option('--clean', is_flag=True,
+              help='Удалить собранные файлы, которых нет в новом манифесте')
+def assets_build_command(clean):
+    """Собрать статику с хешами в именах, сжатыми копиями и миниатюрами"""
+    result = build_assets(current_app._get_current_object(), clean=clean)
+    assets.load()
+    print(f"Собрано файлов: {result['files']}, сжатых копий: {result['compressed']}, "
+          f"вариантов картинок: {result['variants']}")
+    if not result['brotli']:
+        print("brotli не установлен: собраны только .gz")
+    if not result['images']:
+        print("Pillow не установлен: миниатюры и WebP не собраны")
+    if clean:
+        print(f"Удалено устаревших файлов: {result['removed']}")
+
+# Инициализация базы данных: таблицы, новые колонки и индексы, тестовые
+# данные. Выполняется в контексте приложения: `flask init-db` при деплое
+# или bootstrap_db() при старте, если версия схемы в базе устарела
 def init_db():
-    with app.app_context():
-        db.create_all()
-        
-        if not Category.query.first():
-            print("Создаем тестовые данные...")
-            
-            categories = [
-                Category(name='Закуски', description='Легкие закуски к столу'),
-                Category(name='Основные блюда', description='Горячие блюда'),
-                Category(name='Напитки', description='Холодные и горячие напитки'),
-                Category(name='Десерты', description='Сладкие блюда')
-            ]
-            
-            for category in categories:
-                db.session.add(category)
-            
-            db.session.commit()
-            
-            menu_items = [
-                MenuItem(name='Брускетта', description='С помидорами и базиликом', price=12.5, category_id=1, image='bruschetta.jpg'),
-                MenuItem(name='Стейк', description='Говяжий стейк с овощами', price=42.5, category_id=2, image='steak.jpg'),
-                MenuItem(name='Салат Цезарь', description='С курицей и соусом', price=16.0, category_id=1, image='caesar.jpg'),
-                MenuItem(name='Кофе', description='Арабика 200мл', price=7.0, category_id=3, image='coffee.jpg'),
-                MenuItem(name='Тирамису', description='Итальянский десерт', price=14.0, category_id=4, image='tiramisu.jpg'),
-                MenuItem(name='Суп Том Ям', description='Тайский острый суп с креветками', price=19.5, category_id=2, image='tomyam.jpg'),
-                MenuItem(name='Паста Карбонара', description='С беконом и сливочным соусом', price=17.0, category_id=2, image='carbonara.jpg'),
-                MenuItem(name='Чизкейк', description='Классический чизкейк', price=12.5, category_id=4, image='cheesecake.jpg')
-            ]
-            
-            for item in menu_items:
-                db.session.add(item)
-            
-            if not User.query.filter_by(username='admin').first():
-                admin = User(
-                    username='admin',
-                    email='admin@gurman.by',
-                    password=generate_password_hash('admin123'),
-                    role='admin'
-                )
-                db.session.add(admin)
-            
-            if not User.query.filter_by(username='user').first():
-                user = User(
-                    username='user',
-                    email='user@gurman.by',
-                    password=generate_password_hash('user123'),
-                    role='customer'
-                )
-                db.session.add(user)
-            
+    db.create_all()
+    created_columns = ensure_columns(db.engine, db.metadata)
+    if created_columns:
+        print(f"Добавлены колонки: {', '.join(created_columns)}")
+    if 'order.updated_at' in created_columns:
+        db.session.execute(update(Order).where(Order.updated_at.is_(None))
+                           .values(updated_at=Order.created_at))
+        db.session.commit()
+    for model in (Category, MenuItem):
+        if f'{model.__table__.name}.updated_at' in created_columns:
+            db.session.execute(update(model).where(model.updated_at.is_(None))
+                               .values(updated_at=datetime.utcnow()))
             db.session.commit()
-        print("База данных инициализирована!")
+    created_indexes = ensure_indexes(db.engine, db.metadata)
+    if created_indexes:
+        print(f"Созданы индексы: {', '.join(created_indexes)}")
+    
+    # Базы, созданные до появления таблицы статистики
+    if stats.is_empty() and Order.query.first():
+        print("Пересчитываем статистику заказов...")
+        stats.rebuild()
+    
+    if not Category.query.first():
+        print("Создаем тестовые данные...")
+        
+        categories = [
+            Category(name='Закуски', description='Легкие закуски к столу'),
+            Category(name='Основные блюда', description='Горячие блюда'),
+            Category(name='Напитки', description='Холодные и горячие напитки'),
+            Category(name='Десерты', description='Сладкие блюда')
+        ]
+        
+        for category in categories:
+            db.session.add(category)
+        
+        db.session.commit()
+        
+        menu_items = [
+            MenuItem(name='Брускетта', description='С помидорами и базиликом', price=12.5, category_id=1, image='bruschetta.jpg'),
+            MenuItem(name='Стейк', description='Говяжий стейк с овощами', price=42.5, category_id=2, image='steak.jpg'),
+            MenuItem(name='Салат Цезарь', description='С курицей и соусом', price=16.0, category_id=1, image='caesar.jpg'),
+            MenuItem(name='Кофе', description='Арабика 200мл', price=7.0, category_id=3, image='coffee.jpg'),
+            MenuItem(name='Тирамису', description='Итальянский десерт', price=14.0, category_id=4, image='tiramisu.jpg'),
+            MenuItem(name='Суп Том Ям', description='Тайский острый суп с креветками', price=19.5, category_id=2, image='tomyam.jpg'),
+            MenuItem(name='Паста Карбонара', description='С беконом и сливочным соусом', price=17.0, category_id=2, image='carbonara.jpg'),
+            MenuItem(name='Чизкейк', description='Классический чизкейк', price=12.5, category_id=4, image='cheesecake.jpg')
+        ]
+        
+        for item in menu_items:
+            db.session.add(item)
+        
+        if not User.query.filter_by(username='admin').first():
+            admin = User(
+                username='admin',
+                email='admin@gurman.by',
+                password=credentials.hash_password('admin123'),
+                role='admin'
+            )
+            db.session.add(admin)
+        
+        if not User.query.filter_by(username='user').first():
+            user = User(
+                username='user',
+                email='user@gurman.by',
+                password=credentials.hash_password('user123'),
+                role='customer'
+            )
+            db.session.add(user)
+        
+        db.session.commit()
+    set_schema_version(db.engine, SCHEMA_VERSION)
+    print("База данных инициализирована!")
 
-if __name__ == '__main__':
+def bootstrap_db():
+    """Выполнить init_db(), если база не доведена до SCHEMA_VERSION (True, если выполнялась)"""
+    if schema_version(db.engine) == SCHEMA_VERSION:
+        return False
     init_db()
+    return True
+
+@click.command('init-db')
+@click.option('--force', is_flag=True, help='Выполнить, даже если версия схемы актуальна')
+@with_appcontext
+def init_db_command(force):
+    """Создать таблицы, индексы и тестовые данные и записать версию схемы"""
+    if force:
+        init_db()
+    elif not bootstrap_db():
+        print(f"Схема базы актуальна (версия {SCHEMA_VERSION})")
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        bootstrap_db()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,246 @@
+"""Сборка статики (flask assets build): имена с хешем содержимого, манифест, сжатие, миниатюры"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+
+from flask import abort, current_app, request, send_from_directory
+from werkzeug.local import LocalProxy
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - без brotli собираются только .gz
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - без Pillow миниатюры не строятся
+    Image = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# Длина хеша в имени собранного файла: css/style.3f2a9c1b7d0e.css
+HASH_LENGTH = 12
+FINGERPRINTED = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}\.[^./]+$')
+
+# Что имеет смысл сжимать заранее: картинки уже сжаты
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+IMAGE_TYPES = ('.jpg', '.jpeg', '.png')
+
+
+def variant_name(filename, size=None, format=None):
+    """Имя варианта картинки: images/carbonara.jpg -> images/carbonara.thumb.webp"""
+    if not size and not format:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    if size:
+        stem = f'{stem}.{size}'
+    return f'{stem}.{format}' if format else f'{stem}{ext}'
+
+
+class AssetManifest:
+    """Манифест собранной статики и отдача файлов с хешем в имени"""
+
+    def __init__(self, app=None):
+        self.assets = {}
+        self.output_dir = None
+        self.prefix = None
+        self.url_path = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_DIR', 'dist')
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        # Размеры уменьшенных копий картинок из images/: имя -> (ширина, высота)
+        app.config.setdefault('ASSETS_IMAGE_SIZES', {'thumb': (480, 360)})
+        app.config.setdefault('ASSETS_WEBP_QUALITY', 80)
+        self.output_dir = os.path.join(app.static_folder, app.config['ASSETS_DIR'])
+        self.prefix = app.config['ASSETS_DIR']
+        self.url_path = app.static_url_path
+        self.load()
+
+        app.add_url_rule(f'{app.static_url_path}/{app.config["ASSETS_DIR"]}/<path:filename>',
+                         'static_assets', self.send_asset)
+        app.url_defaults(self._fingerprint_static)
+        app.add_template_global(self.url, 'asset_url')
+        app.extensions['assets'] = self
+
+    def load(self):
+        """Перечитать манифест (нет манифеста - нет собранных файлов)"""
+        path = os.path.join(self.output_dir, MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.assets = json.load(f)['assets']
+        except FileNotFoundError:
+            self.assets = {}
+        return len(self.assets)
+
+    def resolve(self, filename, size=None, format=None):
+        """Путь внутри static/ для файла или его варианта.
+
+        Если варианта нет, используется исходный файл; если файл не
+        собран, возвращается filename без изменений.
+        """
+        built = self.assets.get(variant_name(filename, size, format))
+        if built is None and (size or format):
+            built = self.assets.get(filename)
+        if built is None:
+            return filename
+        return f'{self.prefix}/{built}'
+
+    def url(self, filename, size=None, format=None):
+        """URL файла из static/ (asset_url в шаблонах). Работает без контекста запроса"""
+        return f'{self.url_path}/{self.resolve(filename, size, format)}'
+
+    def _fingerprint_static(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.resolve(values['filename'])
+
+    def send_asset(self, filename):
+        # Только файлы с хешем в имени: manifest.json меняется при каждой
+        # сборке и не может кэшироваться как immutable
+        if not FINGERPRINTED.search(filename):
+            abort(404)
+        max_age = current_app.config['ASSETS_MAX_AGE']
+        accepted = request.accept_encodings
+        name, encoding = filename, None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[candidate]:
+                path = safe_join(self.output_dir, filename + suffix)
+                if path is not None and os.path.isfile(path):
+                    name, encoding = filename + suffix, candidate
+                    break
+
+        # Тип содержимого берется по исходному имени, а не по .br/.gz
+        mimetype = mimetypes.guess_type(filename)[0] if encoding else None
+        response = send_from_directory(self.output_dir, name, mimetype=mimetype,
+                                       max_age=max_age, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def _write_hashed(output_dir, name, data):
+    """Записать data под именем с хешем содержимого, вернуть это имя"""
+    stem, ext = os.path.splitext(name)
+    hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+    path = os.path.join(output_dir, hashed)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Через временный файл: воркеры не должны увидеть недописанный файл
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+    return hashed
+
+
+def _write_compressed(path, data):
+    """Сжатые копии рядом с файлом; возвращает число записанных копий"""
+    written = 0
+    copies = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        copies.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, compressed in copies:
+        # Сжатая копия, которая не меньше оригинала, только мешает
+        if len(compressed) < len(data) and not os.path.exists(path + suffix):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written += 1
+    return written
+
+
+def _image_variants(source, name, sizes, webp_quality):
+    """Пары (имя варианта, байты): уменьшенные копии и WebP"""
+    variants = []
+    with Image.open(source) as original:
+        original.load()
+        images = [(None, original)]
+        for size_name, bounds in sizes.items():
+            thumbnail = original.copy()
+            thumbnail.thumbnail(bounds, Image.LANCZOS)
+            images.append((size_name, thumbnail))
+
+        for size_name, image in images:
+            if size_name is not None:
+                buffer = io.BytesIO()
+                image.save(buffer, format=original.format, quality=85, optimize=True)
+                variants.append((variant_name(name, size_name), buffer.getvalue()))
+
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if image.mode in ('LA', 'P') else 'RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, format='WEBP', quality=webp_quality, method=6)
+            variants.append((variant_name(name, size_name, 'webp'), buffer.getvalue()))
+    return variants
+
+
+def build_assets(app, clean=False):
+    """Собрать статику app в ASSETS_DIR и записать манифест (clean=True удаляет старые версии)"""
+    static_folder = app.static_folder
+    output_dir = os.path.join(static_folder, app.config['ASSETS_DIR'])
+    sizes = app.config['ASSETS_IMAGE_SIZES']
+    assets = {}
+    result = {'files': 0, 'compressed': 0, 'variants': 0,
+              'brotli': brotli is not None, 'images': Image is not None}
+
+    for root, dirs, files in os.walk(static_folder):
+        # Уже собранное не собираем повторно
+        dirs[:] = sorted(d for d in dirs
+                         if os.path.join(root, d) != output_dir and not d.startswith('.'))
+        for file in sorted(files):
+            if file.startswith('.'):
+                continue
+            source = os.path.join(root, file)
+            name = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            hashed = assets[name] = _write_hashed(output_dir, name, data)
+            result['files'] += 1
+            ext = os.path.splitext(file)[1].lower()
+            if ext in COMPRESSIBLE:
+                result['compressed'] += _write_compressed(os.path.join(output_dir, hashed), data)
+            if Image is not None and ext in IMAGE_TYPES and name.startswith('images/'):
+                for variant, variant_data in _image_variants(
+                        source, name, sizes, app.config['ASSETS_WEBP_QUALITY']):
+                    assets[variant] = _write_hashed(output_dir, variant, variant_data)
+                    result['variants'] += 1
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'assets': assets}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    if clean:
+        result['removed'] = _remove_stale(output_dir, set(assets.values()))
+    return result
+
+
+def _remove_stale(output_dir, keep):
+    removed = 0
+    for root, dirs, files in os.walk(output_dir):
+        for file in files:
+            path = os.path.join(root, file)
+            name = os.path.relpath(path, output_dir).replace(os.sep, '/')
+            base = name[:-3] if name.endswith(('.gz', '.br')) else name
+            if name == MANIFEST_NAME or base in keep:
+                continue
+            os.remove(path)
+            removed += 1
+    # Пустые каталоги от удаленных файлов
+    for root, dirs, files in os.walk(output_dir, topdown=False):
+        if root != output_dir and not os.listdir(root):
+            os.rmdir(root)
+    return removed
+
+
+assets = LocalProxy(lambda: current_app.extensions['assets'])
@@ -0,0 +1,429 @@
+"""Нагрузочный тест приложения на смеси типичных сценариев.
+
+Сценарии:
+  browse         - главная, меню, /api/menu с If-None-Match
+  checkout       - оформление заказа из случайной корзины
+  customer_poll  - опрос заказов (since), событий и новых заказов клиентом
+  admin_poll     - опрос списка заказов и статистики администратором
+
+По умолчанию запросы идут через тестовый клиент Flask в этом же процессе
+(тогда считается и число SQL-запросов), с --gunicorn - по HTTP к
+запущенному gunicorn. База заполняется benchmarks/seed.py во временном
+файле, если не задан DATABASE_URL и не указан --no-seed.
+
+Результат печатается таблицей (пропускная способность, перцентили
+задержки, SQL-запросы на запрос) и может быть сохранен в JSON (--save)
+и сравнен с сохраненным ранее (--compare).
+
+Запуск из корня проекта:
+    python benchmarks/loadtest.py --duration 20 --concurrency 4 --save benchmarks/results/base.json
+    python benchmarks/loadtest.py --duration 20 --concurrency 4 --compare benchmarks/results/base.json
+    python benchmarks/loadtest.py --gunicorn --workers 4 --concurrency 16
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    _tmpdir = tempfile.mkdtemp(prefix='bench-load-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+DEFAULT_MIX = {'browse': 50, 'checkout': 10, 'customer_poll': 30, 'admin_poll': 10}
+
+
+class ClientTransport:
+    """Запросы через тестовый клиент Flask с подсчетом SQL-запросов"""
+
+    def __init__(self, app):
+        from querycount import count_queries
+        self._count_queries = count_queries
+        self.client = app.test_client()
+
+    def request(self, method, path, json_body=None, form=None, headers=None):
+        with self._count_queries() as counter:
+            response = self.client.open(path, method=method, json=json_body, data=form,
+                                        headers=headers or {})
+            body = response.get_data()
+        return response.status_code, response.headers, body, counter.count
+
+
+class HttpTransport:
+    """Запросы по HTTP к запущенному серверу, cookie хранятся на сессию"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect())
+
+    def request(self, method, path, json_body=None, form=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                return response.status, response.headers, response.read(), None
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read(), None
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    """Задержки, ошибки и SQL-запросы по операциям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+
+    def record(self, name, seconds, ok, queries):
+        with self._lock:
+            op = self.operations.setdefault(name, {'latencies': [], 'errors': 0, 'queries': None})
+            op['latencies'].append(seconds)
+            if not ok:
+                op['errors'] += 1
+            if queries is not None:
+                op['queries'] = (op['queries'] or 0) + queries
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class VirtualUser:
+    """Один пользователь сайта: сессия, курсоры опроса и состояние меню"""
+
+    def __init__(self, transport, recorder, rng, username, password):
+        self.transport = transport
+        self.recorder = recorder
+        self.rng = rng
+        self.username = username
+        self.password = password
+        self.menu_etag = None
+        self.menu_ids = []
+        self.orders_cursor = None
+        self.events_cursor = None
+
+    def call(self, name, method, path, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            status, headers, body, queries = self.transport.request(method, path, **kwargs)
+        except OSError:
+            self.recorder.record(name, time.perf_counter() - start, False, None)
+            return None, None, None
+        self.recorder.record(name, time.perf_counter() - start, status in expect, queries)
+        return status, headers, body
+
+    def login(self):
+        self.call('login', 'POST', '/login', expect=(302,),
+                  form={'username': self.username, 'password': self.password})
+
+    def browse(self):
+        self.call('index', 'GET', '/')
+        self.call('menu', 'GET', '/menu')
+        headers = {'If-None-Match': f'"{self.menu_etag}"'} if self.menu_etag else {}
+        status, response_headers, body = self.call('api_menu', 'GET', '/api/menu',
+                                                   expect=(200, 304), headers=headers)
+        if status == 200:
+            self.menu_etag = (response_headers.get('ETag') or '').strip('"')
+            self.menu_ids = [item['id'] for category in json.loads(body) for item in category['items']]
+
+    def checkout(self):
+        if not self.menu_ids:
+            self.browse()
+        if not self.menu_ids:
+            return
+        cart = [{'id': self.rng.choice(self.menu_ids), 'quantity': self.rng.randint(1, 3)}
+                for _ in range(self.rng.randint(1, 6))]
+        self.call('order', 'POST', '/order', json_body={
+            'items': cart, 'delivery_address': 'ул. Тестовая, д. 1', 'phone': '+375291234567'
+        })
+
+    def customer_poll(self):
+        path = '/api/user/orders/update'
+        if self.orders_cursor:
+            path += '?since=' + urllib.parse.quote(self.orders_cursor)
+        status, headers, body = self.call('user_orders_update', 'GET', path, expect=(200, 204))
+        if headers is not None and headers.get('X-Changes-Cursor'):
+            self.orders_cursor = headers['X-Changes-Cursor']
+
+        path = '/api/realtime/updates'
+        if self.events_cursor is not None:
+            path += f'?cursor={self.events_cursor}'
+        status, headers, body = self.call('realtime_updates', 'GET', path)
+        if status == 200:
+            self.events_cursor = json.loads(body).get('cursor')
+
+        self.call('check_new', 'GET', '/api/orders/check_new')
+
+    def admin_poll(self):
+        path = '/api/admin/orders/update?status=all&date='
+        if self.orders_cursor:
+            path += '&since=' + urllib.parse.quote(self.orders_cursor)
+        status, headers, body = self.call('admin_orders_update', 'GET', path, expect=(200, 204))
+        if headers is not None and headers.get('X-Changes-Cursor'):
+            self.orders_cursor = headers['X-Changes-Cursor']
+        self.call('admin_stats', 'GET', '/api/admin/stats')
+
+
+def run_worker(make_transport, recorder, mix, deadline, seed, customer):
+    rng = random.Random(seed)
+    customer_user = VirtualUser(make_transport(), recorder, rng, *customer)
+    admin_user = VirtualUser(make_transport(), recorder, rng, 'admin', 'admin123')
+    customer_user.login()
+    admin_user.login()
+
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(scenarios, weights)[0]
+        actor = admin_user if scenario == 'admin_poll' else customer_user
+        getattr(actor, scenario)()
+
+
+def summarize(recorder, elapsed):
+    operations = {}
+    total_requests = 0
+    total_errors = 0
+    for name, op in sorted(recorder.operations.items()):
+        latencies = sorted(op['latencies'])
+        count = len(latencies)
+        total_requests += count
+        total_errors += op['errors']
+        operations[name] = {
+            'count': count,
+            'errors': op['errors'],
+            'rps': round(count / elapsed, 2),
+            'mean_ms': round(sum(latencies) / count * 1000, 3),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3),
+            # Только для тестового клиента: по HTTP запросы к базе не видны
+            'queries_per_request': round(op['queries'] / count, 2) if op['queries'] is not None else None,
+        }
+    return {
+        'requests': total_requests,
+        'errors': total_errors,
+        'seconds': round(elapsed, 2),
+        'rps': round(total_requests / elapsed, 2),
+    }, operations
+
+
+def print_report(totals, operations, baseline=None):
+    header = f'{"operation":<22}{"count":>8}{"err":>6}{"rps":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}{"q/req":>7}'
+    print(header)
+    print('-' * len(header))
+    for name, op in operations.items():
+        line = (f'{name:<22}{op["count"]:>8}{op["errors"]:>6}{op["rps"]:>9.1f}'
+                f'{op["p50_ms"]:>9.2f}{op["p95_ms"]:>9.2f}{op["p99_ms"]:>9.2f}'
+                f'{op["max_ms"]:>9.2f}{_format_queries(op["queries_per_request"]):>7}')
+        base = (baseline or {}).get('operations', {}).get(name)
+        if base:
+            line += f'   p50 {_change(base["p50_ms"], op["p50_ms"])}, p95 {_change(base["p95_ms"], op["p95_ms"])}'
+        print(line)
+    print('-' * len(header))
+    line = f'total: {totals["requests"]} requests, {totals["errors"]} errors, {totals["rps"]:.1f} req/s'
+    if baseline:
+        line += f' (baseline {baseline["totals"]["rps"]:.1f} req/s, {_change(baseline["totals"]["rps"], totals["rps"])})'
+    print(line)
+
+
+def _format_queries(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def _change(before, after):
+    if not before:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, worker_class, port, target='wsgi:app', extra_env=None):
+    # Класс воркера - через окружение: от него в gunicorn.conf.py зависит monkey-patching
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_WORKER_CLASS=worker_class,
+               **(extra_env or {}))
+    # При нескольких воркерах шина событий - SQLite; файл не должен попасть в instance/
+    env.setdefault('REALTIME_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='bench-realtime-'),
+                                                    'realtime.db'))
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--log-level', 'warning', target]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'gunicorn завершился с кодом {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn не запустился за 30 секунд')
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'неизвестный сценарий: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10.0, help='Секунд измерения')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Секунд прогрева без замеров')
+    parser.add_argument('--concurrency', type=int, default=1, help='Число параллельных пользователей')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Веса сценариев, например browse=50,checkout=10')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-seed', action='store_true', help='Не заполнять базу (DATABASE_URL уже заполнена)')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--page-views', type=int, default=50000)
+    parser.add_argument('--gunicorn', action='store_true', help='Нагружать gunicorn по HTTP')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--save', help='Сохранить результат в JSON')
+    parser.add_argument('--compare', help='Сравнить с сохраненным JSON')
+    args = parser.parse_args()
+
+    from app import create_app
+    from benchmarks.seed import SEED_PASSWORD, seed_database
+
+    app = create_app()
+    app.config['PAGEVIEW_TRACKING'] = True
+    if args.no_seed:
+        seeded = None
+    else:
+        seeded = seed_database(app, users=args.users, orders=args.orders,
+                               page_views=args.page_views, seed=args.seed)
+        print('seeded: ' + ' '.join(f'{key}={value}' for key, value in seeded.items()))
+
+    with app.app_context():
+        from database import db
+        from models import User
+        customers = db.session.execute(
+            db.select(User.username).where(User.username.like('bench%')).order_by(User.id)
+        ).scalars().all()
+    if not customers:
+        customers = ['user']
+    password = SEED_PASSWORD if customers != ['user'] else 'user123'
+
+    server = None
+    if args.gunicorn:
+        port = _free_port()
+        server = start_gunicorn(args.workers, args.worker_class, port)
+        base_url = f'http://127.0.0.1:{port}'
+        make_transport = lambda: HttpTransport(base_url)
+        target = f'gunicorn workers={args.workers} class={args.worker_class}'
+    else:
+        make_transport = lambda: ClientTransport(app)
+        target = 'flask test client'
+
+    try:
+        print(f'target: {target}, concurrency={args.concurrency}, mix={args.mix}')
+        if args.warmup > 0:
+            _run(make_transport, Recorder(), args, args.warmup, customers, password)
+        recorder = Recorder()
+        elapsed = _run(make_transport, recorder, args, args.duration, customers, password)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    totals, operations = summarize(recorder, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(totals, operations, baseline)
+
+    if args.save:
+        result = {
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': _git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'target': target,
+                'database': app.config['SQLALCHEMY_DATABASE_URI'],
+                'seeded': seeded,
+                'args': {key: value for key, value in vars(args).items() if key not in ('save', 'compare')},
+            },
+            'totals': totals,
+            'operations': operations,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f'saved: {args.save}')
+
+
+def _run(make_transport, recorder, args, duration, customers, password):
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(target=run_worker, args=(
+            make_transport, recorder, args.mix, deadline, args.seed + i,
+            (customers[i % len(customers)], password)
+        ))
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    main()
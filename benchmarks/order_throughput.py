@@ -0,0 +1,116 @@
+"""Нагрузочный бенчмарк оформления заказа (POST /order).
+
+Сравнивает прежнюю реализацию (MenuItem.query.get на каждую позицию,
+отдельный add для каждой OrderItem, запрос администраторов после каждого
+заказа) с текущей. Используется временная база SQLite и тестовый клиент Flask.
+
+Запуск из корня проекта:
+    python benchmarks/order_throughput.py --orders 300 --lines 30
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmpdir = tempfile.mkdtemp(prefix='bench-orders-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_tmpdir, 'bench.db'))
+
+from flask import jsonify, request
+from flask_login import current_user, login_required
+
+from app import add_realtime_update, create_app, init_db
+from database import db
+from models import MenuItem, Order, OrderItem, User
+from querycount import count_queries
+
+app = create_app()
+
+
+@app.route('/bench/legacy-order', methods=['POST'])
+@login_required
+def legacy_order():
+    """Оформление заказа в том виде, как оно было до оптимизации"""
+    cart_items = request.json.get('items', [])
+    total_amount = 0
+    order_items_data = []
+    for item in cart_items:
+        menu_item = MenuItem.query.get(item['id'])
+        if not menu_item:
+            continue
+        total_amount += menu_item.price * item['quantity']
+        order_items_data.append({
+            'menu_item': menu_item,
+            'quantity': item['quantity'],
+            'price_at_time': menu_item.price
+        })
+
+    order = Order(user_id=current_user.id, status='pending', total_amount=total_amount,
+                  delivery_address='', phone='', notes='')
+    db.session.add(order)
+    db.session.flush()
+    for item_data in order_items_data:
+        db.session.add(OrderItem(order_id=order.id,
+                                 menu_item_id=item_data['menu_item'].id,
+                                 quantity=item_data['quantity'],
+                                 price_at_time=item_data['price_at_time']))
+    db.session.commit()
+
+    add_realtime_update(current_user.id, 'new_order', {'order_id': order.id})
+    for admin in User.query.filter_by(role='admin').all():
+        add_realtime_update(admin.id, 'new_order_admin', {'order_id': order.id})
+    return jsonify({'success': True, 'order_id': order.id})
+
+
+def seed_menu(items):
+    with app.app_context():
+        existing = MenuItem.query.count()
+        for i in range(existing, items):
+            db.session.add(MenuItem(name=f'Блюдо {i}', price=10 + i % 20,
+                                    category_id=1 + i % 4, image='default-dish.jpg'))
+        db.session.commit()
+        return [m.id for m in MenuItem.query.all()]
+
+
+def run(client, url, carts):
+    with count_queries() as counter:
+        start = time.perf_counter()
+        for cart in carts:
+            response = client.post(url, json={'items': cart})
+            assert response.status_code == 200, response.data
+        elapsed = time.perf_counter() - start
+    return len(carts) / elapsed, counter.count / len(carts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=300)
+    parser.add_argument('--lines', type=int, default=30)
+    parser.add_argument('--menu-items', type=int, default=200)
+    args = parser.parse_args()
+
+    app.config['PAGEVIEW_TRACKING'] = False
+    with app.app_context():
+        init_db()
+    item_ids = seed_menu(args.menu_items)
+
+    rng = random.Random(1)
+    carts = [
+        [{'id': rng.choice(item_ids), 'quantity': rng.randint(1, 3)} for _ in range(args.lines)]
+        for _ in range(args.orders)
+    ]
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'user', 'password': 'user123'})
+
+    print(f'orders={args.orders} lines={args.lines} db={app.config["SQLALCHEMY_DATABASE_URI"]}')
+    for name, url in (('legacy', '/bench/legacy-order'), ('current', '/order')):
+        rate, queries = run(client, url, carts)
+        print(f'{name:>8}: {rate:8.1f} orders/s, {queries:6.1f} queries/order')
+
+
+if __name__ == '__main__':
+    main()
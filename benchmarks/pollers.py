@@ -0,0 +1,198 @@
+"""Сколько одновременных long-poll клиентов выдерживает каждый режим gunicorn.
+
+Для каждого класса воркеров (--modes) запускается gunicorn с
+gunicorn.conf.py, и на /api/realtime/poll одновременно приходят N
+клиентов (--pollers), каждый ждет событий --poll-timeout секунд. Пока
+они висят, отдельный поток раз в 0.25 с запрашивает /api/menu: так
+видно, остаются ли у сервера свободные воркеры для обычных страниц.
+
+Уровень считается выдержанным, если все опросы завершились без ошибок
+не позже чем через poll-timeout + 1 с. После первого невыдержанного
+уровня следующие для этого режима пропускаются (кроме --all-levels).
+
+Запуск из корня проекта:
+    python benchmarks/pollers.py --modes sync,gthread,gevent --pollers 8,32,128,512
+    python benchmarks/pollers.py --workers 2 --save benchmarks/results/pollers.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    _tmpdir = tempfile.mkdtemp(prefix='bench-pollers-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from benchmarks.loadtest import HttpTransport, _free_port, _git_revision, percentile, start_gunicorn
+
+# Задержка сверх poll-timeout, после которой опрос считается обслуженным с опозданием
+SLACK = 1.0
+
+
+def login_cookie(base_url, username, password):
+    """Заголовок Cookie сессии пользователя: вход один раз на всех клиентов"""
+    transport = HttpTransport(base_url)
+    status, _, _, _ = transport.request(
+        'POST', '/login', form={'username': username, 'password': password})
+    if status != 302:
+        raise SystemExit(f'Не удалось войти как {username}: HTTP {status}')
+    for handler in transport.opener.handlers:
+        jar = getattr(handler, 'cookiejar', None)
+        if jar is not None:
+            return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+    return ''
+
+
+def poll_once(port, cookie, poll_timeout, results, start_barrier):
+    start_barrier.wait()
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=poll_timeout * 2 + 10)
+    try:
+        conn.request('GET', f'/api/realtime/poll?timeout={poll_timeout}', headers={'Cookie': cookie})
+        response = conn.getresponse()
+        response.read()
+        ok = response.status == 200
+    except OSError:
+        ok = False
+    finally:
+        conn.close()
+    results.append((ok, time.perf_counter() - start))
+
+
+def probe(port, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/menu', timeout=30) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except OSError:
+            latencies.append(None)
+        stop.wait(0.25)
+
+
+def run_level(port, cookie, pollers, poll_timeout):
+    results = []
+    probes = []
+    barrier = threading.Barrier(pollers)
+    threads = [threading.Thread(target=poll_once, args=(port, cookie, poll_timeout, results, barrier))
+               for _ in range(pollers)]
+    stop = threading.Event()
+    prober = threading.Thread(target=probe, args=(port, stop, probes))
+    for thread in threads:
+        thread.start()
+    prober.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    prober.join()
+
+    durations = sorted(duration for ok, duration in results if ok)
+    errors = sum(1 for ok, _ in results if not ok)
+    late = sum(1 for duration in durations if duration > poll_timeout + SLACK)
+    probe_ok = sorted(latency for latency in probes if latency is not None)
+    return {
+        'pollers': pollers,
+        'served': len(durations) - late,
+        'late': late,
+        'errors': errors,
+        'sustained': errors == 0 and late == 0,
+        'poll_p50_ms': round(percentile(durations, 0.5) * 1000, 1),
+        'poll_max_ms': round(durations[-1] * 1000, 1) if durations else 0.0,
+        'probe_p50_ms': round(percentile(probe_ok, 0.5) * 1000, 1),
+        'probe_p95_ms': round(percentile(probe_ok, 0.95) * 1000, 1),
+        'probe_errors': len(probes) - len(probe_ok),
+    }
+
+
+def print_report(results):
+    header = (f"{'mode':<10}{'pollers':>8}{'served':>8}{'late':>6}{'errors':>8}"
+              f"{'poll p50':>10}{'poll max':>10}{'menu p50':>10}{'menu p95':>10}  ok")
+    print(header)
+    print('-' * len(header))
+    for mode, levels in results.items():
+        for level in levels:
+            print(f"{mode:<10}{level['pollers']:>8}{level['served']:>8}{level['late']:>6}"
+                  f"{level['errors']:>8}{level['poll_p50_ms']:>10}{level['poll_max_ms']:>10}"
+                  f"{level['probe_p50_ms']:>10}{level['probe_p95_ms']:>10}  "
+                  f"{'yes' if level['sustained'] else 'no'}")
+
+
+def _available(mode):
+    if mode != 'gevent':
+        return True
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='sync,gthread,gevent',
+                        help='Классы воркеров gunicorn через запятую')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='Потоков на воркер для gthread')
+    parser.add_argument('--pollers', default='8,32,128,512',
+                        help='Уровни числа одновременных клиентов через запятую')
+    parser.add_argument('--poll-timeout', type=float, default=5.0,
+                        help='Сколько секунд каждый клиент ждет событий')
+    parser.add_argument('--all-levels', action='store_true',
+                        help='Не пропускать уровни после первого невыдержанного')
+    parser.add_argument('--save', help='Сохранить результат в JSON')
+    args = parser.parse_args()
+
+    levels = [int(value) for value in args.pollers.split(',') if value]
+    results = {}
+    for mode in [value for value in args.modes.split(',') if value]:
+        if not _available(mode):
+            print(f'{mode}: gevent не установлен, режим пропущен')
+            continue
+        port = _free_port()
+        server = start_gunicorn(args.workers, mode, port,
+                                extra_env={'GUNICORN_THREADS': str(args.threads)})
+        try:
+            cookie = login_cookie(f'http://127.0.0.1:{port}', 'user', 'user123')
+            results[mode] = []
+            for pollers in levels:
+                level = run_level(port, cookie, pollers, args.poll_timeout)
+                results[mode].append(level)
+                print(f"{mode}: {pollers} клиентов - {'выдержано' if level['sustained'] else 'не выдержано'}")
+                if not level['sustained'] and not args.all_levels:
+                    break
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print()
+    print_report(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'created_at': datetime.now().isoformat(timespec='seconds'),
+                    'git_revision': _git_revision(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'args': {key: value for key, value in vars(args).items() if key != 'save'},
+                },
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f'saved: {args.save}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Микробенчмарк хранилища обновлений в реальном времени.
+
+Сравнивает прежнюю реализацию (список на пользователя, срез после каждого
+добавления, фильтр по строке времени) с InMemoryEventBus на кольцевых буферах.
+
+Запуск из корня проекта:
+    python benchmarks/realtime_ring.py --users 1000 --events 200000
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from realtime import InMemoryEventBus
+
+
+class LegacyRealtimeStore:
+    """Реализация из app.py до перехода на шину событий"""
+
+    def __init__(self):
+        self.realtime_updates = defaultdict(list)
+        self.update_lock = threading.Lock()
+
+    def add(self, user_id, update_type, data):
+        with self.update_lock:
+            self.realtime_updates[user_id].append({
+                'type': update_type,
+                'data': data,
+                'timestamp': datetime.now().isoformat()
+            })
+            if len(self.realtime_updates[user_id]) > 100:
+                self.realtime_updates[user_id] = self.realtime_updates[user_id][-100:]
+
+    def get(self, user_id, last_timestamp=None):
+        with self.update_lock:
+            if user_id not in self.realtime_updates:
+                return []
+            if last_timestamp:
+                return [u for u in self.realtime_updates[user_id]
+                        if u['timestamp'] > last_timestamp]
+            return self.realtime_updates[user_id][-10:]
+
+
+def bench_legacy(users, events, reads):
+    store = LegacyRealtimeStore()
+    rng = random.Random(1)
+    cursors = {}
+
+    start = time.perf_counter()
+    for _ in range(events):
+        user_id = rng.randrange(users)
+        store.add(user_id, 'order_status_changed', {'status': 'ready'})
+        cursors.setdefault(user_id, store.realtime_updates[user_id][-1]['timestamp'])
+    append_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(reads):
+        user_id = rng.randrange(users)
+        store.get(user_id, cursors.get(user_id, ''))
+    read_time = time.perf_counter() - start
+    return append_time, read_time
+
+
+def bench_ring(users, events, reads):
+    bus = InMemoryEventBus()
+    rng = random.Random(1)
+    cursors = {}
+
+    start = time.perf_counter()
+    for _ in range(events):
+        user_id = rng.randrange(users)
+        event = bus.publish(user_id, 'order_status_changed', {'status': 'ready'})
+        cursors.setdefault(user_id, event['id'])
+    append_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(reads):
+        user_id = rng.randrange(users)
+        bus.read(user_id, after=cursors.get(user_id, 0))
+    read_time = time.perf_counter() - start
+    return append_time, read_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--reads', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f'users={args.users} events={args.events} reads={args.reads}')
+    for name, bench in (('legacy', bench_legacy), ('ring', bench_ring)):
+        append_time, read_time = bench(args.users, args.events, args.reads)
+        print(f'{name:>8}: append {append_time / args.events * 1e6:7.2f} us/op, '
+              f'read {read_time / args.reads * 1e6:7.2f} us/op')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Синтетическая база для бенчмарков.
+
+Поверх тестовых данных init_db() добавляет пользователей, заказы с
+позициями и просмотры страниц пакетными INSERT, затем пересчитывает
+статистику заказов. Данные детерминированы параметром --seed.
+Пароль всех созданных пользователей - SEED_PASSWORD.
+
+Запуск из корня проекта (база берется из DATABASE_URL):
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py --users 1000 --orders 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select
+
+SEED_PASSWORD = 'bench123'
+# Размер пачки одного INSERT
+CHUNK_SIZE = 5000
+
+PAGES = ('/', '/menu', '/order', '/profile/orders', '/admin/orders')
+STATUSES = ('pending', 'preparing', 'ready', 'delivered', 'cancelled')
+# Доля заказов по статусам: большинство старых заказов уже доставлены
+STATUS_WEIGHTS = (5, 3, 2, 80, 10)
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _insert(db, model, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(insert(model), chunk)
+
+
+def seed_database(app, users=100, orders=1000, items_per_order=3, page_views=10000,
+                  days=90, seed=1):
+    """Заполнить базу приложения app синтетическими данными.
+
+    Возвращает словарь с числом добавленных строк по таблицам и временем.
+    """
+    from app import init_db
+    from credentials import credentials
+    from database import db
+    from models import MenuItem, Order, OrderItem, PageView, User
+    import stats
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    with app.app_context():
+        init_db()
+        # Один хеш на всех: хеширование тысяч паролей заняло бы минуты
+        password = credentials.hash_password(SEED_PASSWORD)
+        first_user = (db.session.execute(select(func.max(User.id))).scalar() or 0) + 1
+        _insert(db, User, [
+            {'username': f'bench{first_user + i}', 'email': f'bench{first_user + i}@example.com',
+             'password': password, 'role': 'customer'}
+            for i in range(users)
+        ])
+        db.session.commit()
+
+        user_ids = db.session.execute(select(User.id).where(User.role == 'customer')).scalars().all()
+        menu = db.session.execute(select(MenuItem.id, MenuItem.price)).all()
+        now = datetime.utcnow()
+        span = days * 24 * 3600
+
+        first_order = (db.session.execute(select(func.max(Order.id))).scalar() or 0) + 1
+        order_rows = []
+        item_rows = []
+        for order_id in range(first_order, first_order + orders):
+            created_at = now - timedelta(seconds=rng.randrange(span))
+            lines = rng.sample(menu, min(len(menu), rng.randint(1, items_per_order * 2 - 1)))
+            total = 0.0
+            for menu_item_id, price in lines:
+                quantity = rng.randint(1, 3)
+                total += price * quantity
+                item_rows.append({'order_id': order_id, 'menu_item_id': menu_item_id,
+                                  'quantity': quantity, 'price_at_time': price})
+            order_rows.append({
+                'id': order_id,
+                'user_id': rng.choice(user_ids),
+                'total_amount': round(total, 2),
+                'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                'created_at': created_at,
+                'updated_at': created_at,
+                'delivery_address': f'ул. Тестовая, д. {rng.randint(1, 200)}',
+                'phone': f'+375{rng.randint(100000000, 999999999)}',
+                'notes': '',
+            })
+        _insert(db, Order, order_rows)
+        _insert(db, OrderItem, item_rows)
+        db.session.commit()
+
+        _insert(db, PageView, [
+            {'user_id': rng.choice(user_ids), 'page_url': rng.choice(PAGES),
+             'viewed_at': now - timedelta(seconds=rng.randrange(span)),
+             'ip_address': '127.0.0.1'}
+            for _ in range(page_views)
+        ])
+        db.session.commit()
+
+        stats.rebuild()
+
+    return {
+        'users': users,
+        'orders': len(order_rows),
+        'order_items': len(item_rows),
+        'page_views': page_views,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--page-views', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=90, help='Период, по которому распределены заказы')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    result = seed_database(app, users=args.users, orders=args.orders,
+                           items_per_order=args.items_per_order,
+                           page_views=args.page_views, days=args.days, seed=args.seed)
+    print(f'db={app.config["SQLALCHEMY_DATABASE_URI"]} ' +
+          ' '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Бенчмарк сериализации списка заказов администратора.
+
+Сравнивает прежний путь (ORM-объекты с joinedload, словарь и strftime
+на каждый заказ, стандартный json) с текущим (выборка колонок,
+скомпилированная схема serializers.ADMIN_ORDER, app.json). Используется
+временная база SQLite.
+
+Запуск из корня проекта:
+    python benchmarks/serializers.py --sizes 50 500 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmpdir = tempfile.mkdtemp(prefix='bench-serializers-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_tmpdir, 'bench.db'))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+
+from app import create_app, init_db
+from database import db
+from models import Order, User
+from serializers import ADMIN_ORDER, install_json_provider
+
+app = create_app()
+
+
+def legacy_dump(limit):
+    orders = Order.query.options(joinedload(Order.user))\
+                        .order_by(Order.created_at.desc(), Order.id.desc())\
+                        .limit(limit).all()
+    result = []
+    for order in orders:
+        address = order.delivery_address
+        if address and len(address) > 50:
+            address = address[:50] + '...'
+        result.append({
+            'id': order.id,
+            'username': order.user.username,
+            'total_amount': order.total_amount,
+            'status': order.status,
+            'created_at': order.created_at.strftime('%d.%m.%Y %H:%M'),
+            'delivery_address': address,
+            'phone': order.phone
+        })
+    return json.dumps(result, ensure_ascii=False, sort_keys=True)
+
+
+def current_dump(limit):
+    rows = db.session.query(*ADMIN_ORDER.columns())\
+                     .join(User, Order.user_id == User.id)\
+                     .order_by(Order.created_at.desc(), Order.id.desc())\
+                     .limit(limit).all()
+    return app.json.dumps(ADMIN_ORDER.dump_rows(rows))
+
+
+def seed_orders(count):
+    rng = random.Random(1)
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        user_ids = [user.id for user in User.query.all()]
+        db.session.execute(insert(Order), [
+            {
+                'user_id': rng.choice(user_ids),
+                'status': rng.choice(('pending', 'preparing', 'delivered')),
+                'total_amount': round(rng.uniform(5, 200), 2),
+                'delivery_address': 'ул. Тестовая, д. %d, кв. %d, подъезд 2, домофон 45' % (i, i % 90),
+                'phone': '+7900%07d' % i,
+                'notes': '',
+                'created_at': start + timedelta(minutes=i),
+            }
+            for i in range(count)
+        ])
+        db.session.commit()
+
+
+def measure(func, limit, repeat):
+    with app.app_context():
+        func(limit)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(limit)
+        return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app.config['PAGEVIEW_TRACKING'] = False
+    with app.app_context():
+        init_db()
+    seed_orders(max(args.sizes))
+
+    print(f'json={install_json_provider(app)} db={app.config["SQLALCHEMY_DATABASE_URI"]}')
+    for size in args.sizes:
+        legacy = measure(legacy_dump, size, args.repeat)
+        current = measure(current_dump, size, args.repeat)
+        print(f'{size:>6} orders: legacy {legacy:8.2f} ms, current {current:8.2f} ms, '
+              f'x{legacy / current:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Время холодного старта: импорт, create_app(), подготовка базы, первый запрос.
+
+Каждый замер выполняется в новом процессе Python, как при запуске
+воркера или перезапуске контейнера. Этапы:
+  import        - импорт модуля app (Flask, SQLAlchemy, модели)
+  create_app    - создание приложения и расширений, без обращения к базе
+  database      - bootstrap_db() (проверка отметки версии схемы) или,
+                  для сравнения, безусловный init_db(), как до фабрики
+  first_request - первый GET /menu (соединение с базой, шаблоны, кэш меню)
+
+Сценарии: fresh - пустая база (полная инициализация), ready - база уже
+инициализирована (так стартуют воркеры и перезапуски).
+
+Запуск из корня проекта:
+    python benchmarks/startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ('import', 'create_app', 'database', 'first_request')
+
+
+def child(mode):
+    """Замер в текущем процессе; результат - JSON в stdout"""
+    timings = {}
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    timings['import'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app = app_module.create_app()
+    timings['create_app'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with app.app_context():
+        if mode == 'init_db':
+            app_module.init_db()
+        else:
+            app_module.bootstrap_db()
+    timings['database'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = app.test_client().get('/menu')
+    timings['first_request'] = time.perf_counter() - start
+    if response.status_code != 200:
+        raise SystemExit(f'/menu: HTTP {response.status_code}')
+    print(json.dumps(timings))
+
+
+def measure(database_url, mode):
+    env = dict(os.environ, DATABASE_URL=database_url, PAGEVIEW_TRACKING='0')
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--child', choices=('bootstrap', 'init_db'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix='bench-startup-')
+    runs = {}
+    for mode in ('bootstrap', 'init_db'):
+        fresh = [measure(f'sqlite:///{tmpdir}/fresh-{mode}-{i}.db', mode) for i in range(args.repeat)]
+        ready_url = f'sqlite:///{tmpdir}/ready-{mode}.db'
+        measure(ready_url, mode)
+        ready = [measure(ready_url, mode) for _ in range(args.repeat)]
+        runs[f'{mode}/fresh'] = fresh
+        runs[f'{mode}/ready'] = ready
+
+    print(f"{'scenario':<20}" + ''.join(f'{phase:>15}' for phase in PHASES) + f"{'total':>10}")
+    for name, samples in runs.items():
+        medians = {phase: statistics.median(sample[phase] for sample in samples) for phase in PHASES}
+        total = statistics.median(sum(sample.values()) for sample in samples)
+        print(f'{name:<20}' + ''.join(f'{medians[phase] * 1000:>13.1f}ms' for phase in PHASES)
+              + f'{total * 1000:>8.1f}ms')
+    print(f'(медиана {args.repeat} запусков, каждый в новом процессе)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import and_, func, select
+from werkzeug.local import LocalProxy
+
+from assets import assets
+from database import db, on_commit
+from models import Category, MenuItem
+
+CategoryEntry = namedtuple('CategoryEntry', 'id name description items')
+MenuItemEntry = namedtuple('MenuItemEntry',
+                           'id name description price image category_id image_url thumbnail_url')
+
+# Поля блюда, которые можно запросить через ?fields=
+ITEM_FIELDS = ('id', 'name', 'description', 'price', 'image', 'image_url', 'thumbnail_url')
+
+# Сколько вариантов ответа (фильтр + набор полей) хранить для одной версии
+MAX_VARIANTS = 64
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок меню для одной версии каталога"""
+
+    def __init__(self, version, categories, menu_items, dumps, last_modified):
+        self.version = version
+        self.categories = categories
+        self.menu_items = menu_items
+        self.last_modified = last_modified
+        self.built_at = time.monotonic()
+        self._dumps = dumps
+        self._variants = {}
+        self.payload, self.etag = self.variant()
+
+    def variant(self, category_ids=None, fields=ITEM_FIELDS):
+        """JSON меню только для категорий category_ids и полей блюд fields.
+
+        Возвращает пару (payload, etag); результат кэшируется в снимке.
+        """
+        key = (frozenset(category_ids) if category_ids else None, tuple(fields))
+        cached = self._variants.get(key)
+        if cached is not None:
+            return cached
+
+        result = []
+        for category in self.categories:
+            if not category.items or (category_ids and category.id not in category_ids):
+                continue
+            result.append({
+                'id': category.id,
+                'name': category.name,
+                'description': category.description,
+                'items': [{field: getattr(item, field) for field in fields}
+                          for item in category.items]
+            })
+
+        payload = self._dumps(result).encode('utf-8')
+        cached = (payload, hashlib.sha1(payload).hexdigest()[:20])
+        if len(self._variants) < MAX_VARIANTS:
+            self._variants[key] = cached
+        return cached
+
+
+def _image_urls(image):
+    """Адреса картинки блюда: оригинал и миниатюра (WebP, если собрана)"""
+    if not image:
+        return None, None
+    filename = f'images/{image}'
+    return assets.url(filename), assets.url(filename, size='thumb', format='webp')
+
+
+class MenuCatalog:
+    """Кэш меню: категории с доступными блюдами и готовый JSON для /api/menu"""
+
+    def __init__(self, app=None):
+        self.version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Версия каталога живет в памяти процесса: изменения из других
+        # воркеров видны не позже чем через столько секунд
+        app.config.setdefault('MENU_CACHE_TTL', 30.0)
+        app.extensions['menu_catalog'] = self
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def get(self):
+        """Актуальный снимок меню (строится заново при смене версии или по TTL)"""
+        snapshot = self._snapshot
+        ttl = current_app.config['MENU_CACHE_TTL']
+        if (snapshot is not None and snapshot.version == self.version
+                and (not ttl or time.monotonic() - snapshot.built_at < ttl)):
+            return snapshot
+
+        with self._lock:
+            version = self.version
+        previous = snapshot
+        snapshot = self._build(version)
+        # Удаление строки не сдвигает max(updated_at): если меню изменилось,
+        # а время нет, берем текущее, иначе If-Modified-Since вернул бы 304
+        if (previous is not None and snapshot.etag != previous.etag
+                and snapshot.last_modified <= previous.last_modified):
+            snapshot.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _build(self, version):
+        # Один запрос: категории с доступными блюдами, без загрузки ORM-объектов,
+        # и время последнего изменения меню (включая скрытые блюда)
+        rows = db.session.execute(
+            select(select(func.max(Category.updated_at)).scalar_subquery(),
+                   select(func.max(MenuItem.updated_at)).scalar_subquery(),
+                   Category.id, Category.name, Category.description,
+                   MenuItem.id, MenuItem.name, MenuItem.description,
+                   MenuItem.price, MenuItem.image)
+            .outerjoin(MenuItem, and_(MenuItem.category_id == Category.id,
+                                      MenuItem.is_available == True))
+            .order_by(Category.id, MenuItem.id)
+        ).all()
+
+        # Группировка за один проход: строки уже отсортированы по категории
+        entries = {}
+        menu_items = []
+        changed = [value for value in (rows[0][:2] if rows else ()) if value is not None]
+        last_modified = max(changed, default=datetime(1970, 1, 1))
+        for _, _, category_id, category_name, category_description, *item in rows:
+            category = entries.get(category_id)
+            if category is None:
+                category = entries[category_id] = CategoryEntry(
+                    category_id, category_name, category_description, [])
+            if item[0] is not None:
+                entry = MenuItemEntry(*item, category_id, *_image_urls(item[4]))
+                category.items.append(entry)
+                menu_items.append(entry)
+        menu_items.sort(key=lambda item: item.id)
+
+        return CatalogSnapshot(version, list(entries.values()), menu_items, current_app.json.dumps,
+                               last_modified.replace(tzinfo=timezone.utc, microsecond=0))
+
+
+menu_catalog = LocalProxy(lambda: current_app.extensions['menu_catalog'])
+
+
+def _changed_menu_rows(session):
+    return {obj.id for obj in (*session.new, *session.dirty, *session.deleted)
+            if isinstance(obj, (MenuItem, Category))}
+
+
+on_commit('menu_changed', _changed_menu_rows, lambda changes: menu_catalog.invalidate())
@@ -0,0 +1,118 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPool as GeventThreadPool
+except ImportError:  # pragma: no cover - gevent нужен только для gevent-воркеров
+    gevent_monkey = None
+
+
+class PasswordHashingBusy(Exception):
+    """Все слоты хеширования заняты дольше PASSWORD_HASH_TIMEOUT"""
+
+
+class CredentialService:
+    """Хеширование и проверка паролей в ограниченном пуле потоков"""
+
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:600000'
+        self.salt_length = 16
+        self.timeout = 10.0
+        self._executor = None
+        self._gevent = False
+        self._slots = None
+        self._workers = 0
+        self._queue = 0
+        self._pid = None
+        self._executor_lock = threading.Lock()
+        self._reference = None
+        self._reference_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Формат werkzeug ('pbkdf2:sha256:600000', 'scrypt:32768:8:1');
+        # хеши с другими параметрами пересчитываются при входе
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        # Сверх WORKERS одновременных хешей ждут не больше QUEUE запросов,
+        # остальные получают PasswordHashingBusy
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 32)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10.0)
+
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.salt_length = app.config['PASSWORD_SALT_LENGTH']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._workers = app.config['PASSWORD_HASH_WORKERS']
+        self._queue = app.config['PASSWORD_HASH_QUEUE']
+        self._start_executor()
+        self._reference = None
+        app.extensions['credentials'] = self
+
+    def hash_password(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, user, password):
+        """Проверить пароль; устаревший хеш заменяется новым до commit вызывающего"""
+        if user is None:
+            # Холостая проверка: по времени ответа не узнать, есть ли такое имя
+            self._run(check_password_hash, self._reference_hash(), password)
+            return False
+        if not self._run(check_password_hash, user.password, password):
+            return False
+        if self.needs_rehash(user.password):
+            user.password = self.hash_password(password)
+        return True
+
+    def needs_rehash(self, pwhash):
+        method = pwhash.split('$', 1)[0]
+        return method != self._reference_hash().split('$', 1)[0]
+
+    def _reference_hash(self):
+        # Хеш с текущими параметрами: по нему werkzeug-формат метода
+        # (с подставленными значениями по умолчанию) и холостая проверка
+        if self._reference is None:
+            with self._reference_lock:
+                if self._reference is None:
+                    self._reference = self.hash_password('')
+        return self._reference
+
+    def _start_executor(self):
+        # hashlib отпускает GIL, так что хеш в пуле не блокирует потоки и гринлеты;
+        # под gevent свой пул хаба: общий get_hub().threadpool не ограничен
+        # PASSWORD_HASH_WORKERS. Семафор создается здесь же: после
+        # monkey.patch_all() ожидание слота должно переключать гринлеты
+        self._gevent = gevent_monkey is not None and gevent_monkey.is_module_patched('threading')
+        if self._gevent:
+            self._executor = GeventThreadPool(self._workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(self._workers + self._queue)
+        self._pid = os.getpid()
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        if self._pid != os.getpid():
+            # После fork() (gunicorn --preload) потоков пула родителя в процессе нет
+            with self._executor_lock:
+                if self._pid != os.getpid():
+                    self._start_executor()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHashingBusy()
+        try:
+            if self._gevent:
+                return self._executor.apply(func, args)
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+
+credentials = LocalProxy(lambda: current_app.extensions['credentials'])
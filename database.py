@@ -1,3 +1,292 @@
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, orm, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import QueuePool
+
+
+class RoutingSession(Session):
+    """Сессия, которая отправляет чтения представлений с @read_only на read-движок"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper, clause, bind=bind, **kwargs)
+        if (bind is None and not self._flushing and has_app_context()
+                and g.get('db_read_only') and engine is self._db.engine):
+            read_engine = current_app.extensions.get('db_read_engine')
+            if read_engine is not None:
+                return read_engine
+        return engine
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Профили движка базы данных. Выбирается настройкой DATABASE_PROFILE,
+# по умолчанию по схеме SQLALCHEMY_DATABASE_URI.
+DATABASE_PROFILES = {
+    'sqlite': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'cache_size': -64000,       # 64 МБ
+            'mmap_size': 268435456,     # 256 МБ
+            'temp_store': 'MEMORY',
+        },
+        # Соединения только для чтения к тому же WAL-файлу
+        'read_pragmas': {
+            'query_only': 'ON',
+            'busy_timeout': 5000,
+            'cache_size': -64000,
+            'mmap_size': 268435456,
+        },
+    },
+    'server': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    },
+}
+
+
+class PoolMetrics:
+    """Счетчики пула соединений одного движка"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.wait_time_total += seconds
+            self.wait_time_max = max(self.wait_time_max, seconds)
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self, pool):
+        with self._lock:
+            data = {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'wait_time_total': round(self.wait_time_total, 6),
+                'wait_time_max': round(self.wait_time_max, 6),
+                'wait_time_avg': round(self.wait_time_total / self.waits, 6) if self.waits else 0.0,
+            }
+        data['pool_class'] = type(pool).__name__
+        for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+            method = getattr(pool, name, None)
+            if method is not None:
+                data[name] = method()
+        return data
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, который замеряет время ожидания свободного соединения"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics = getattr(self, 'metrics', None)
+            if metrics is not None:
+                metrics.record_wait(time.perf_counter() - start)
+
+
+def _profile_name(app):
+    profile = app.config.get('DATABASE_PROFILE') or os.environ.get('DATABASE_PROFILE')
+    if profile:
+        return profile
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    return 'sqlite' if uri.startswith('sqlite') else 'server'
+
+
+def _is_memory_sqlite(uri):
+    return uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri)
+
+
+def engine_options(app):
+    """Параметры create_engine для выбранного профиля (размеры пула - из DB_POOL_*)"""
+    profile = DATABASE_PROFILES[_profile_name(app)]
+    if _is_memory_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        # База в памяти живет в одном соединении, пул не нужен
+        return {}
+
+    options = {'poolclass': TimedQueuePool}
+    for key, env in (('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'),
+                     ('pool_timeout', 'DB_POOL_TIMEOUT'), ('pool_recycle', 'DB_POOL_RECYCLE')):
+        value = os.environ.get(env, profile.get(key))
+        if value is not None:
+            options[key] = int(value)
+    if profile.get('pool_pre_ping'):
+        options['pool_pre_ping'] = True
+    return options
+
+
+def _install_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def _install_pool_metrics(engine):
+    metrics = PoolMetrics()
+    engine.pool.metrics = metrics
+    event.listen(engine, 'connect', lambda *args: metrics.incr('connects'))
+    event.listen(engine, 'checkout', lambda *args: metrics.incr('checkouts'))
+    event.listen(engine, 'checkin', lambda *args: metrics.incr('checkins'))
+    event.listen(engine, 'invalidate', lambda *args: metrics.incr('invalidations'))
+
+
+def _default_read_uri(engine):
+    """URI read-only соединения для файла SQLite (None для других баз)"""
+    url = engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        return None
+    return f'sqlite:///file:{os.path.abspath(url.database)}?mode=ro&uri=true'
+
+
+def _create_read_engine(app, engine, profile):
+    uri = app.config.get('SQLALCHEMY_READ_URI') or os.environ.get('DATABASE_READ_URL')
+    if not uri and app.config.get('DATABASE_READ_BIND', True):
+        uri = _default_read_uri(engine)
+    if not uri:
+        return None
+
+    read_engine = create_engine(uri, **engine_options(app))
+    if read_engine.dialect.name == 'sqlite':
+        _install_sqlite_pragmas(read_engine, profile.get('read_pragmas', {}))
+    _install_pool_metrics(read_engine)
+    return read_engine
+
+
+def init_database(app):
+    """Настроить движок по профилю, read-движок для @read_only и подключить db к приложению"""
+    profile_name = _profile_name(app)
+    app.config['DATABASE_PROFILE'] = profile_name
+    profile = DATABASE_PROFILES[profile_name]
+    options = dict(engine_options(app))
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    db.init_app(app)
+
+    pragmas = dict(profile.get('pragmas', {}))
+    pragmas.update(app.config.get('SQLITE_PRAGMAS', {}))
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite' and pragmas:
+                _install_sqlite_pragmas(engine, pragmas)
+            _install_pool_metrics(engine)
+
+        read_engine = _create_read_engine(app, db.engine, profile)
+    if read_engine is not None:
+        app.extensions['db_read_engine'] = read_engine
+
+
+def read_only(view):
+    """Пометить представление как только читающее: запросы идут на read-движок"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        previous = g.get('db_read_only', False)
+        g.db_read_only = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.db_read_only = previous
+    return wrapper
+
+
+def pool_metrics():
+    """Метрики пулов всех движков текущего приложения"""
+    engines = {bind or 'default': engine for bind, engine in db.engines.items()}
+    read_engine = current_app.extensions.get('db_read_engine')
+    if read_engine is not None:
+        engines['read'] = read_engine
+    return {
+        name: engine.pool.metrics.as_dict(engine.pool)
+        for name, engine in engines.items()
+    }
+
+
+def dispose_engines(app, close=True):
+    """Сбросить пулы соединений всех движков (после fork() - с close=False)"""
+    with app.app_context():
+        engines = list(db.engines.values())
+    read_engine = app.extensions.get('db_read_engine')
+    if read_engine is not None:
+        engines.append(read_engine)
+    for engine in engines:
+        metrics = getattr(engine.pool, 'metrics', None)
+        engine.dispose(close=close)
+        # dispose() заменяет пул новым: слушатели событий остаются на движке,
+        # а счетчики нужно перенести, иначе pool_metrics() падает
+        engine.pool.metrics = metrics
+
+
+def upsert_increment(model, keys, increments, rows):
+    """Прибавить increments к строкам model с ключами keys или вставить rows, которых нет"""
+    dialect = db.session.get_bind().dialect.name
+    # Один INSERT ... ON CONFLICT DO UPDATE на все строки
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[getattr(model, key) for key in keys],
+            set_={name: getattr(model, name) + getattr(stmt.excluded, name) for name in increments}
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    # Остальные базы: UPDATE, а если строки нет - INSERT
+    for row in rows:
+        result = db.session.execute(
+            update(model)
+            .where(*(getattr(model, key) == row[key] for key in keys))
+            .values({name: getattr(model, name) + row[name] for name in increments})
+        )
+        if result.rowcount == 0:
+            db.session.add(model(**row))
+
+
+def on_commit(name, collect, callback):
+    """Вызвать callback(changes) после commit; changes копятся из collect(session) после каждого flush"""
+    @event.listens_for(orm.Session, 'after_flush')
+    def track_changes(session, flush_context):
+        changes = collect(session)
+        if changes:
+            session.info.setdefault(name, set()).update(changes)
+
+    @event.listens_for(orm.Session, 'after_commit')
+    def apply_changes(session):
+        changes = session.info.pop(name, None)
+        if changes:
+            callback(changes)
 
-db = SQLAlchemy()
\ No newline at end of file
+    @event.listens_for(orm.Session, 'after_rollback')
+    def discard_changes(session):
+        session.info.pop(name, None)
@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
+
+
+class FragmentCacheExtension(Extension):
+    """Тег {% cache 'имя', ключ, ... %}: ключи должны меняться вместе с данными блока"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(key)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.get_or_render(tuple(key), caller)
+
+
+class FragmentCache:
+    """LRU-кэш отрендеренных фрагментов шаблонов (старые версии вытесняются новыми)"""
+
+    def __init__(self, app=None):
+        self.max_size = 2048
+        self.max_length = 256 * 1024
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+        app.config.setdefault('FRAGMENT_CACHE_SIZE', 2048)
+        # Фрагменты длиннее стольких символов не кэшируются
+        app.config.setdefault('FRAGMENT_CACHE_MAX_LENGTH', 256 * 1024)
+        # Каталог для скомпилированных шаблонов: новые воркеры не компилируют их заново
+        app.config.setdefault('TEMPLATE_BYTECODE_CACHE_DIR', None)
+        self.max_size = app.config['FRAGMENT_CACHE_SIZE']
+        self.max_length = app.config['FRAGMENT_CACHE_MAX_LENGTH']
+
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        if app.config['FRAGMENT_CACHE_ENABLED']:
+            app.jinja_env.fragment_cache = self
+        if app.config['TEMPLATE_BYTECODE_CACHE_DIR']:
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_CACHE_DIR'])
+        app.extensions['fragment_cache'] = self
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+
+        fragment = Markup(render())
+        if len(fragment) <= self.max_length:
+            with self._lock:
+                self._entries[key] = fragment
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def preload_templates(app):
+    """Скомпилировать все шаблоны заранее (например, в мастере gunicorn до fork)"""
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+fragment_cache = LocalProxy(lambda: current_app.extensions['fragment_cache'])
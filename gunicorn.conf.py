@@ -0,0 +1,77 @@
+"""Настройки gunicorn для продакшена.
+
+gunicorn читает gunicorn.conf.py из текущего каталога автоматически,
+поэтому достаточно команды `gunicorn wsgi:app`. Параметры задаются
+переменными окружения:
+
+    PORT                         порт (по умолчанию 8000)
+    WEB_CONCURRENCY              число воркеров (по умолчанию 2)
+    GUNICORN_WORKER_CLASS        gevent (по умолчанию, если установлен gevent),
+                                 gthread или sync
+    GUNICORN_THREADS             потоков на воркер для gthread (8)
+    GUNICORN_WORKER_CONNECTIONS  одновременных соединений на воркер gevent (1000)
+    GUNICORN_TIMEOUT             таймаут зависшего воркера, секунды (60)
+"""
+import os
+
+
+# Long-poll и SSE держат соединение открытым: у gthread оно занимает поток,
+# у gevent - только гринлет (сравнение режимов: benchmarks/pollers.py)
+def _default_worker_class():
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return 'gthread'
+    return 'gevent'
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or _default_worker_class()
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+
+# Версия схемы проверяется в on_starting, а не при импорте wsgi.py
+os.environ['INIT_DB_ON_IMPORT'] = '0'
+
+# Шина в памяти у каждого воркера своя: событие, опубликованное в одном
+# воркере, не дошло бы до SSE и long-poll клиентов, подключенных к другому
+if workers > 1:
+    os.environ.setdefault('REALTIME_BACKEND', 'sqlite')
+    if os.environ['REALTIME_BACKEND'] == 'memory':
+        raise RuntimeError('REALTIME_BACKEND=memory работает только с одним воркером '
+                           f'(WEB_CONCURRENCY={workers}); используйте sqlite')
+
+if worker_class == 'gevent':
+    # Патчить нужно до импорта приложения в мастере: иначе блокировки,
+    # созданные при импорте (шина событий, кэши), останутся настоящими
+    # блокировками потоков и ожидание в одном гринлете остановит весь воркер
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def on_starting(server):
+    """Один раз в мастере: схема и тестовые данные БД, компиляция шаблонов"""
+    from app import bootstrap_db
+    from database import dispose_engines
+    from fragments import preload_templates
+    from wsgi import app
+
+    with app.app_context():
+        initialized = bootstrap_db()
+    templates = preload_templates(app)
+    # Соединения мастера не должны достаться воркерам
+    dispose_engines(app)
+    server.log.info('База данных %s, шаблонов скомпилировано: %s',
+                    'инициализирована' if initialized else 'актуальна', templates)
+
+
+def post_fork(server, worker):
+    from database import dispose_engines
+    from wsgi import app
+
+    dispose_engines(app, close=False)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import inspect, select
+from werkzeug.local import LocalProxy
+
+from database import db, on_commit
+from models import User
+
+# Изменение этих полей сбрасывает кэш пользователя
+IDENTITY_FIELDS = ('username', 'email', 'password', 'role')
+
+
+class UserSnapshot(UserMixin):
+    """Неизменяемый снимок пользователя для current_user"""
+
+    __slots__ = ('id', 'username', 'email', 'role')
+
+    def __init__(self, id, username, email, role):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'username', username)
+        object.__setattr__(self, 'email', email)
+        object.__setattr__(self, 'role', role)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserSnapshot доступен только для чтения')
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.id} {self.username}>'
+
+
+class UserIdentityCache:
+    """LRU-кэш снимков пользователей с коротким TTL для user_loader"""
+
+    def __init__(self, app=None):
+        self.ttl = 30.0
+        self.max_size = 10000
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Изменения из других воркеров видны не позже чем через столько секунд
+        app.config.setdefault('USER_CACHE_TTL', 30.0)
+        app.config.setdefault('USER_CACHE_SIZE', 10000)
+        self.ttl = app.config['USER_CACHE_TTL']
+        self.max_size = app.config['USER_CACHE_SIZE']
+        app.extensions['user_cache'] = self
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        row = db.session.execute(
+            select(User.id, User.username, User.email, User.role).where(User.id == user_id)
+        ).first()
+        if row is None:
+            self.invalidate(user_id)
+            return None
+
+        snapshot = UserSnapshot(*row)
+        with self._lock:
+            self._entries[user_id] = (snapshot, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])
+
+
+def _changed_identities(session):
+    changed = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            if any(attrs[field].history.has_changes() for field in IDENTITY_FIELDS):
+                changed.add(obj.id)
+    return changed
+
+
+def _invalidate_identities(user_ids):
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+
+
+on_commit('identity_changed', _changed_identities, _invalidate_identities)
@@ -0,0 +1,245 @@
+"""Метрики запросов: время ответа, число и время SQL-запросов, медленные запросы"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.local import LocalProxy
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы времени ответа, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+class Histogram:
+    """Гистограмма по набору меток в формате Prometheus"""
+
+    def __init__(self, name, help, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        bucket_names = self.label_names + ('le',)
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(bucket_names, labels + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(bucket_names, labels + ("+Inf",))} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total!r}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+class Counter:
+    """Счетчик по набору меток в формате Prometheus"""
+
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {_format_value(value)}')
+        return lines
+
+
+class RequestMetrics:
+    """Метрики HTTP-запросов и SQL для Prometheus (/metrics)"""
+
+    def __init__(self, app=None):
+        self.slow_query_threshold = 0.5
+        self._lock = threading.Lock()
+        self._sources = {}
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Время обработки HTTP-запроса',
+            ('endpoint', 'method'))
+        self.requests = Counter(
+            'http_requests_total', 'Число HTTP-запросов', ('endpoint', 'method', 'status'))
+        self.sql_queries = Counter(
+            'db_queries_total', 'Число SQL-запросов', ('endpoint',))
+        self.sql_time = Counter(
+            'db_query_duration_seconds_total', 'Суммарное время SQL-запросов', ('endpoint',))
+        self.slow_queries = Counter(
+            'db_slow_queries_total', 'Число медленных SQL-запросов', ('endpoint',))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_ENDPOINT', '/metrics')
+        # С токеном /metrics требует заголовок Authorization: Bearer <токен>
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_SERVER_TIMING', False)
+        # Запросы дольше стольких секунд пишутся в лог вместе с параметрами
+        app.config.setdefault('SLOW_QUERY_THRESHOLD', 0.5)
+        self.slow_query_threshold = app.config['SLOW_QUERY_THRESHOLD']
+
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config['METRICS_ENDPOINT'], 'metrics', self.metrics_view)
+
+    def add_source(self, prefix, func):
+        """Добавить в /metrics значения словаря, который возвращает func().
+
+        Каждое числовое значение становится метрикой <prefix>_<ключ>;
+        вложенные словари (например, метрики пулов) дают метки.
+        """
+        self._sources[prefix] = func
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        _local.request = {'queries': 0, 'sql_time': 0.0, 'slow': 0}
+
+    def _finish_request(self, response):
+        start = g.pop('metrics_start', None)
+        stats = getattr(_local, 'request', None)
+        if start is None or stats is None:
+            return response
+
+        duration = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            self.request_duration.observe((endpoint, request.method), duration)
+            self.requests.inc((endpoint, request.method, str(response.status_code)))
+            self.sql_queries.inc((endpoint,), stats['queries'])
+            self.sql_time.inc((endpoint,), stats['sql_time'])
+            if stats['slow']:
+                self.slow_queries.inc((endpoint,), stats['slow'])
+
+        if current_app.config['METRICS_SERVER_TIMING']:
+            response.headers.add(
+                'Server-Timing',
+                f'app;dur={duration * 1000:.1f}, '
+                f'db;dur={stats["sql_time"] * 1000:.1f};desc="{stats["queries"]} queries"'
+            )
+        return response
+
+    def _teardown_request(self, exc):
+        _local.request = None
+
+    def record_query(self, statement, parameters, duration):
+        stats = getattr(_local, 'request', None)
+        slow = duration >= self.slow_query_threshold
+        if stats is not None:
+            stats['queries'] += 1
+            stats['sql_time'] += duration
+            if slow:
+                stats['slow'] += 1
+        if slow:
+            logger.warning('Медленный SQL-запрос (%.3f с): %s; параметры: %.500r',
+                           duration, statement, parameters)
+
+    def expose(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            lines = []
+            for metric in (self.request_duration, self.requests, self.sql_queries,
+                           self.sql_time, self.slow_queries):
+                lines.extend(metric.expose())
+
+        for prefix, func in self._sources.items():
+            try:
+                values = func()
+            except Exception as e:
+                logger.warning('Метрики %s недоступны: %s', prefix, e)
+                continue
+            lines.extend(self._expose_source(prefix, values))
+        return '\n'.join(lines) + '\n'
+
+    def _expose_source(self, prefix, values):
+        series = {}
+        for key, value in values.items():
+            if isinstance(value, dict):
+                for name, nested in value.items():
+                    if isinstance(nested, (int, float)) and not isinstance(nested, bool):
+                        series.setdefault(f'{prefix}_{name}', []).append((f'{{name="{_escape(key)}"}}', nested))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                series.setdefault(f'{prefix}_{key}', []).append(('', value))
+
+        lines = []
+        for name, samples in series.items():
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return lines
+
+    def metrics_view(self):
+        token = current_app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(self.expose(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_start')
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    # Вне контекста приложения запрос не к чему отнести
+    request_metrics = current_app.extensions.get('metrics') if has_app_context() else None
+    if request_metrics is not None:
+        request_metrics.record_query(statement, parameters, duration)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(context):
+    connection = context.connection
+    started = connection.info.get('metrics_query_start') if connection is not None else None
+    if started:
+        started.pop()
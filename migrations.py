@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, delete, inspect, insert, select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+# Версия схемы и тестовых данных, до которой init_db() доводит базу.
+# Увеличивать при добавлении моделей, колонок, индексов или данных, которые
+# должны появиться в уже работающих базах
+SCHEMA_VERSION = 2
+
+# Отдельные метаданные: отметка версии не входит в схему моделей
+schema_version_table = Table(
+    'schema_version', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('version', Integer, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def ensure_indexes(engine, metadata):
+    """Создать индексы из моделей, которых нет в базе; возвращает их имена.
+
+    db.create_all() создает индексы только вместе с новыми таблицами.
+    """
+    created = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=conn)
+                    created.append(index.name)
+    return created
+
+
+def ensure_columns(engine, metadata):
+    """Добавить в таблицы колонки из моделей, которых в них нет; возвращает 'таблица.колонка'.
+
+    Старые строки получают NULL: заполнять их должен вызывающий код.
+    """
+    created = []
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f'ALTER TABLE {preparer.format_table(table)} '
+                    f'ADD COLUMN {preparer.format_column(column)} {column_type}'
+                ))
+                created.append(f'{table.name}.{column.name}')
+    return created
+
+
+def schema_version(engine):
+    """Версия схемы из отметки в базе (None, если init_db() еще не выполнялась)"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                select(schema_version_table.c.version).where(schema_version_table.c.id == 1)
+            ).scalar()
+    except (OperationalError, ProgrammingError):
+        # Таблицы отметки еще нет
+        return None
+
+
+def set_schema_version(engine, version):
+    """Записать отметку версии схемы (таблица создается при необходимости)"""
+    schema_version_table.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(delete(schema_version_table))
+        conn.execute(insert(schema_version_table).values(
+            id=1, version=version, applied_at=datetime.utcnow()))
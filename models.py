@@ -11,12 +11,15 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     orders = db.relationship('Order', backref='user', lazy=True)
-    views = db.relationship('PageView', backref='user', lazy=True)
+    # Просмотров может быть много: отношение возвращает запрос, а не список
+    views = db.relationship('PageView', backref='user', lazy='dynamic')
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
+    # Время последнего изменения: Last-Modified ответа /api/menu
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     items = db.relationship('MenuItem', backref='category', lazy=True)
 
 class MenuItem(db.Model):
@@ -27,8 +30,14 @@ class MenuItem(db.Model):
     image = db.Column(db.String(200))
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     is_available = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     order_items = db.relationship('OrderItem', backref='menu_item', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_menu_item_category_id', 'category_id'),
+        db.Index('ix_menu_item_is_available_category_id', 'is_available', 'category_id'),
+    )
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -36,11 +45,25 @@ class Order(db.Model):
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, preparing, ready, delivered, cancelled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Время последнего изменения: курсор since в API обновлений заказов
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     delivery_address = db.Column(db.Text)
     phone = db.Column(db.String(20))
     notes = db.Column(db.Text)
     
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Профиль и опрос заказов пользователя
+        db.Index('ix_order_user_id_created_at', 'user_id', 'created_at'),
+        # Фильтр администратора по статусу и статистика
+        db.Index('ix_order_status_created_at', 'status', 'created_at'),
+        # Новые заказы, фильтр по дате и постраничный вывод (created_at, id)
+        db.Index('ix_order_created_at_id', 'created_at', 'id'),
+        # Изменения заказов после курсора since (администратор и пользователь)
+        db.Index('ix_order_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_order_user_id_updated_at_id', 'user_id', 'updated_at', 'id'),
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -48,6 +71,10 @@ class OrderItem(db.Model):
     menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price_at_time = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_order_item_order_id', 'order_id'),
+    )
 
 class PageView(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -55,3 +82,40 @@ class PageView(db.Model):
     page_url = db.Column(db.String(200), nullable=False)
     viewed_at = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(45))
+    
+    __table_args__ = (
+        db.Index('ix_page_view_user_id_viewed_at', 'user_id', 'viewed_at'),
+        db.Index('ix_page_view_viewed_at', 'viewed_at'),
+    )
+
+class PageViewDaily(db.Model):
+    """Свернутые просмотры: число просмотров страницы пользователем за день.
+
+    Заполняется командой flask pageviews compact из старых строк PageView;
+    user_id = 0 для просмотров без пользователя.
+    """
+    day = db.Column(db.String(10), primary_key=True)
+    page_url = db.Column(db.String(200), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_page_view_daily_user_id_day', 'user_id', 'day'),
+    )
+
+class OrderStat(db.Model):
+    """Счетчики заказов по статусам: bucket = 'all' или дата 'YYYY-MM-DD'"""
+    bucket = db.Column(db.String(10), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+# Количество позиций заказа одним подзапросом вместо загрузки order.items.
+# Отложенное: подгружается только с options(undefer(Order.items_count))
+Order.items_count = db.column_property(
+    db.select(db.func.count(OrderItem.id))
+    .where(OrderItem.order_id == Order.id)
+    .correlate_except(OrderItem)
+    .scalar_subquery(),
+    deferred=True
+)
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import inspect, select
+from werkzeug.local import LocalProxy
+
+from database import db, on_commit
+from models import User
+
+
+class AdminRecipients:
+    """Кэш id администраторов, которым рассылаются уведомления о заказах"""
+
+    def __init__(self, app=None, ttl=60.0):
+        self.ttl = ttl
+        self._ids = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['admin_recipients'] = self
+
+    def invalidate(self):
+        with self._lock:
+            self._ids = None
+
+    def get(self):
+        ids = self._ids
+        if ids is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return ids
+
+        ids = tuple(db.session.execute(
+            select(User.id).where(User.role == 'admin').order_by(User.id)
+        ).scalars())
+        with self._lock:
+            self._ids = ids
+            self._loaded_at = time.monotonic()
+        return ids
+
+
+admin_recipients = LocalProxy(lambda: current_app.extensions['admin_recipients'])
+
+
+def _changed_admin_rows(session):
+    changed = {obj.id for obj in (*session.new, *session.deleted) if isinstance(obj, User)}
+    changed.update(obj.id for obj in session.dirty
+                   if isinstance(obj, User) and inspect(obj).attrs.role.history.has_changes())
+    return changed
+
+
+on_commit('admins_changed', _changed_admin_rows, lambda changes: admin_recipients.invalidate())
@@ -0,0 +1,121 @@
+"""Статусы заказов: допустимые переходы и пакетная смена статуса"""
+from datetime import datetime
+
+from sqlalchemy import case, select, update
+
+from database import db
+from models import Order
+import stats
+
+STATUSES = ('pending', 'preparing', 'ready', 'delivered', 'cancelled')
+
+# Из какого статуса в какие можно перевести заказ
+TRANSITIONS = {
+    'pending': {'preparing', 'ready', 'cancelled'},
+    'preparing': {'ready', 'cancelled', 'pending'},
+    'ready': {'delivered', 'preparing', 'cancelled'},
+    'delivered': set(),
+    'cancelled': {'pending'},
+}
+
+
+class OrderStatusError(ValueError):
+    """Статус заказа нельзя изменить"""
+
+    def __init__(self, order_id, message):
+        super().__init__(message)
+        self.order_id = order_id
+        self.message = message
+
+
+class OrderNotFound(OrderStatusError):
+    def __init__(self, order_id):
+        super().__init__(order_id, 'Заказ не найден')
+
+
+class InvalidStatus(OrderStatusError):
+    def __init__(self, order_id, status):
+        super().__init__(order_id, f'Неизвестный статус: {status}')
+
+
+class InvalidTransition(OrderStatusError):
+    def __init__(self, order_id, old_status, new_status):
+        super().__init__(order_id, f'Нельзя перевести заказ из "{old_status}" в "{new_status}"')
+        self.old_status = old_status
+        self.new_status = new_status
+
+
+class StatusConflict(OrderStatusError):
+    def __init__(self, order_id=None):
+        super().__init__(order_id, 'Статус заказа изменился во время обновления, повторите запрос')
+
+
+def can_transition(old_status, new_status):
+    return old_status == new_status or new_status in TRANSITIONS.get(old_status, ())
+
+
+def change_statuses(changes, partial=False):
+    """Сменить статусы по парам (order_id, status); возвращает (changed, errors).
+
+    Без partial при любой ошибке не меняется ничего; уведомления публикует вызывающий код.
+    """
+    requested = {}
+    errors = []
+    for order_id, status in changes:
+        if order_id in requested:
+            errors.append(OrderStatusError(order_id, 'Заказ указан несколько раз'))
+        elif status not in STATUSES:
+            errors.append(InvalidStatus(order_id, status))
+        else:
+            requested[order_id] = status
+
+    rows = {}
+    if requested:
+        rows = {row.id: row for row in db.session.execute(
+            select(Order.id, Order.user_id, Order.status, Order.created_at, Order.total_amount)
+            .where(Order.id.in_(requested))
+            .with_for_update()
+        )}
+
+    moves = []
+    for order_id, status in requested.items():
+        row = rows.get(order_id)
+        if row is None:
+            errors.append(OrderNotFound(order_id))
+        elif not can_transition(row.status, status):
+            errors.append(InvalidTransition(order_id, row.status, status))
+        elif row.status != status:
+            moves.append((row, row.status, status))
+
+    if (errors and not partial) or not moves:
+        db.session.rollback()
+        return [], errors
+
+    ids = [row.id for row, _, _ in moves]
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id.in_(ids),
+               # Защита от параллельной смены статуса между SELECT и UPDATE
+               Order.status == case({row.id: old for row, old, _ in moves}, value=Order.id))
+        .values(status=case({row.id: new for row, _, new in moves}, value=Order.id),
+                # Двигает курсор since в API обновлений заказов
+                updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(moves):
+        db.session.rollback()
+        return [], errors + [StatusConflict()]
+
+    stats.record_status_changes(moves)
+    db.session.commit()
+
+    return [{'order_id': row.id, 'user_id': row.user_id, 'old_status': old, 'status': new}
+            for row, old, new in moves], errors
+
+
+def change_status(order_id, status):
+    """Сменить статус одного заказа; при ошибке OrderStatusError"""
+    changed, errors = change_statuses([(order_id, status)])
+    if errors:
+        raise errors[0]
+    return changed[0] if changed else None
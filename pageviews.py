@@ -0,0 +1,254 @@
+import atexit
+import csv
+import gzip
+import os
+import random
+import threading
+from collections import deque
+from datetime import datetime, time, timedelta
+from time import sleep
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+from werkzeug.local import LocalProxy
+
+from database import db, upsert_increment
+from models import PageView, PageViewDaily
+
+# Эндпоинты, которые опрашиваются по таймеру и не считаются просмотрами
+DEFAULT_EXCLUDE_ENDPOINTS = (
+    'static',
+    'static_assets',
+    'main.get_realtime_updates_api',
+    'main.realtime_stream',
+    'main.realtime_poll',
+    'main.check_new_orders',
+    'main.get_latest_orders',
+    'main.api_user_orders_update',
+    'main.api_admin_orders_update',
+    'main.api_admin_stats',
+    'metrics',
+)
+
+
+class PageViewBuffer:
+    """Буфер просмотров страниц: фоновый поток пишет их в базу пачками"""
+
+    def __init__(self, app=None):
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.counters = {
+            'recorded': 0,
+            'sampled_out': 0,
+            'dropped': 0,
+            'flushed': 0,
+            'failed': 0,
+            'flushes': 0,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGEVIEW_TRACKING', True)
+        # При полном буфере новые просмотры отбрасываются (счетчик dropped)
+        app.config.setdefault('PAGEVIEW_BUFFER_SIZE', 10000)
+        app.config.setdefault('PAGEVIEW_BATCH_SIZE', 500)
+        app.config.setdefault('PAGEVIEW_FLUSH_INTERVAL', 5.0)
+        app.config.setdefault('PAGEVIEW_SAMPLE_RATE', 1.0)
+        app.config.setdefault('PAGEVIEW_EXCLUDE_ENDPOINTS', DEFAULT_EXCLUDE_ENDPOINTS)
+        # Без фонового потока буфер сбрасывается прямо в запросе
+        app.config.setdefault('PAGEVIEW_BACKGROUND_FLUSH', True)
+        # Сырые просмотры старше стольких дней сворачивает flask pageviews compact
+        app.config.setdefault('PAGEVIEW_RETENTION_DAYS', 30)
+
+        app.extensions['pageviews'] = self
+        atexit.register(self.shutdown, app)
+
+    def should_track(self, endpoint):
+        """Нужно ли записывать просмотр для эндпоинта"""
+        config = current_app.config
+        if not config['PAGEVIEW_TRACKING'] or endpoint is None:
+            return False
+        if endpoint in config['PAGEVIEW_EXCLUDE_ENDPOINTS']:
+            return False
+        rate = config['PAGEVIEW_SAMPLE_RATE']
+        if rate < 1.0 and random.random() >= rate:
+            with self._lock:
+                self.counters['sampled_out'] += 1
+            return False
+        return True
+
+    def record(self, user_id, page_url, ip_address=None, viewed_at=None):
+        """Поставить просмотр в очередь. Возвращает False, если он отброшен"""
+        config = current_app.config
+        row = {
+            'user_id': user_id,
+            'page_url': page_url[:200],
+            'viewed_at': viewed_at or datetime.utcnow(),
+            'ip_address': ip_address,
+        }
+
+        with self._lock:
+            if len(self._items) >= config['PAGEVIEW_BUFFER_SIZE']:
+                self.counters['dropped'] += 1
+                return False
+            self._items.append(row)
+            self.counters['recorded'] += 1
+            pending = len(self._items)
+
+        if config['PAGEVIEW_BACKGROUND_FLUSH']:
+            self._ensure_thread(current_app._get_current_object())
+            if pending >= config['PAGEVIEW_BATCH_SIZE']:
+                self._wakeup.set()
+        elif pending >= config['PAGEVIEW_BATCH_SIZE']:
+            self.flush()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._items)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['pending'] = len(self._items)
+        return stats
+
+    def flush(self, app=None):
+        """Записать все накопленные просмотры пакетами по PAGEVIEW_BATCH_SIZE.
+
+        Вне контекста приложения (фоновый поток, atexit) app обязателен.
+        """
+        if app is None:
+            app = current_app._get_current_object()
+        batch_size = app.config['PAGEVIEW_BATCH_SIZE']
+        written = 0
+        while True:
+            with self._lock:
+                if not self._items:
+                    break
+                batch = [self._items.popleft()
+                         for _ in range(min(batch_size, len(self._items)))]
+
+            # Отдельный контекст приложения, чтобы не задеть сессию запроса
+            with app.app_context():
+                try:
+                    db.session.execute(insert(PageView), batch)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    with self._lock:
+                        self.counters['failed'] += len(batch)
+                    print(f"Ошибка записи просмотров страниц: {str(e)}")
+                    break
+                finally:
+                    db.session.remove()
+
+            written += len(batch)
+            with self._lock:
+                self.counters['flushed'] += len(batch)
+                self.counters['flushes'] += 1
+        return written
+
+    def shutdown(self, app):
+        """Остановить фоновый поток и записать остаток буфера"""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=10)
+        self.flush(app)
+
+    def _ensure_thread(self, app):
+        # После fork() (gunicorn --preload) поток родителя в дочернем процессе не существует
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(app,),
+                                            name='pageview-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self, app):
+        interval = app.config['PAGEVIEW_FLUSH_INTERVAL']
+        while not self._stopped.is_set():
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            self.flush(app)
+
+
+page_views = LocalProxy(lambda: current_app.extensions['pageviews'])
+
+
+def _add_daily_views(groups):
+    """Прибавить счетчики к свернутым просмотрам в текущей транзакции"""
+    upsert_increment(PageViewDaily, ('day', 'page_url', 'user_id'), ('views',), groups)
+
+
+def _archive_rows(path, ids):
+    """Дописать строки просмотров в CSV (gzip, если имя оканчивается на .gz)"""
+    rows = db.session.execute(
+        select(PageView.id, PageView.user_id, PageView.page_url,
+               PageView.viewed_at, PageView.ip_address)
+        .where(PageView.id.in_(ids)).order_by(PageView.id)
+    ).all()
+    is_new = not os.path.exists(path)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'at', newline='', encoding='utf-8') as archive:
+        writer = csv.writer(archive)
+        if is_new:
+            writer.writerow(['id', 'user_id', 'page_url', 'viewed_at', 'ip_address'])
+        writer.writerows(rows)
+
+
+def compact_page_views(older_than_days, batch_size=1000, archive_path=None, pause=0.0):
+    """Свернуть просмотры старше older_than_days дней в PageViewDaily (и CSV-архив)"""
+    # Граница - полночь (UTC): сворачиваются только целые дни
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=older_than_days), time.min)
+    day = func.date(PageView.viewed_at)
+    user_id = func.coalesce(PageView.user_id, 0)
+    result = {'cutoff': cutoff.isoformat(), 'compacted': 0, 'groups': 0, 'batches': 0}
+
+    while True:
+        ids = db.session.execute(
+            select(PageView.id).where(PageView.viewed_at < cutoff)
+            .order_by(PageView.viewed_at).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        # Каждая пачка - отдельная короткая транзакция: таблица не блокируется
+        # надолго, а прерванный запуск можно просто повторить
+        try:
+            groups = [
+                {'day': str(day_value), 'page_url': page_url,
+                 'user_id': user_value, 'views': views}
+                for day_value, page_url, user_value, views in db.session.execute(
+                    select(day, PageView.page_url, user_id, func.count(PageView.id))
+                    .where(PageView.id.in_(ids))
+                    .group_by(day, PageView.page_url, user_id)
+                )
+            ]
+            if archive_path:
+                _archive_rows(archive_path, ids)
+            _add_daily_views(groups)
+            db.session.execute(delete(PageView).where(PageView.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        result['compacted'] += len(ids)
+        result['groups'] += len(groups)
+        result['batches'] += 1
+        if pause:
+            sleep(pause)
+
+    return result
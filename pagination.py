@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at, row_id):
+    """Курсор страницы: время создания и id последней показанной строки"""
+    return f'{created_at.isoformat()}_{row_id}'
+
+
+def decode_cursor(value):
+    """Разобрать курсор; для пустого или некорректного значения вернуть None"""
+    if not value:
+        return None
+    try:
+        created_at, row_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        return None
+
+
+def keyset_page(query, created_column, id_column, cursor, limit):
+    """Страница (rows, next_cursor) после cursor в порядке (created_at DESC, id DESC)"""
+    if limit < 1:
+        return [], None
+    # Условие по паре (created_at, id) вместо OFFSET: любая страница стоит одинаково
+    if cursor is not None:
+        created_at, row_id = cursor
+        query = query.filter(or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < row_id)
+        ))
+
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+
+def changes_since(query, updated_column, id_column, cursor, limit, overlap=None):
+    """Строки (rows, next_cursor), измененные строго после cursor, по возрастанию (updated_at, id)"""
+    if cursor is not None:
+        updated_at, row_id = cursor
+        query = query.filter(or_(
+            updated_column > updated_at,
+            and_(updated_column == updated_at, id_column > row_id)
+        ))
+
+    rows = query.order_by(updated_column, id_column).limit(limit + 1).all()
+    # Лишняя строка: следующий запрос продолжит с последней выданной, так что
+    # опрос идет вперед при любом числе строк с одинаковым updated_at
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(last.updated_at, last.id)
+
+    position = (rows[-1].updated_at, rows[-1].id) if rows else cursor
+    return rows, resume_cursor(position, overlap)
+
+
+def resume_cursor(position, overlap=None, now=None):
+    """Курсор начала следующего опроса после позиции (updated_at, id)"""
+    if position is None:
+        return None
+    position = tuple(position)
+    # Транзакция, начатая раньше, может закоммититься позже и оказаться перед
+    # position, поэтому последние overlap строки приходят повторно
+    # (клиент заменяет их по id)
+    if overlap:
+        position = min(position, ((now or datetime.utcnow()) - overlap, 0))
+    return encode_cursor(*position)
@@ -0,0 +1,78 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+class QueryCounter:
+    """Счетчик SQL-запросов, выполненных в текущем потоке"""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __repr__(self):
+        return f'<QueryCounter {self.count}>'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, 'counters', ()):
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """Посчитать запросы внутри блока with"""
+    counter = QueryCounter()
+    counters = _local.__dict__.setdefault('counters', [])
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """Проверка для тестов: блок выполняет не больше max_queries запросов.
+
+        with assert_max_queries(3):
+            client.get('/api/admin/orders/update')
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries:
+        statements = '\n'.join(counter.statements)
+        raise AssertionError(
+            f'Ожидалось не больше {max_queries} запросов, выполнено {counter.count}:\n{statements}'
+        )
+
+
+def query_budget(max_queries):
+    """Лимит запросов для представления (QUERY_BUDGET_CHECK; QUERY_BUDGET_STRICT - AssertionError)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if not config.get('QUERY_BUDGET_CHECK', False):
+                return view(*args, **kwargs)
+
+            with count_queries() as counter:
+                rv = view(*args, **kwargs)
+            if counter.count > max_queries:
+                message = (f'{request.endpoint}: {counter.count} SQL-запросов '
+                           f'при лимите {max_queries}')
+                if config.get('QUERY_BUDGET_STRICT', False):
+                    raise AssertionError(message)
+                current_app.logger.warning(message)
+            return rv
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
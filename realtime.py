@@ -0,0 +1,345 @@
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class EventRing:
+    """Кольцевой буфер событий одного пользователя (по возрастанию id)"""
+
+    __slots__ = ('_slots', '_start', '_size', 'touched')
+
+    def __init__(self, capacity):
+        self._slots = [None] * capacity
+        self._start = 0
+        self._size = 0
+        self.touched = 0.0
+
+    def __len__(self):
+        return self._size
+
+    def _at(self, index):
+        return self._slots[(self._start + index) % len(self._slots)]
+
+    def append(self, event):
+        capacity = len(self._slots)
+        if self._size < capacity:
+            self._slots[(self._start + self._size) % capacity] = event
+            self._size += 1
+        else:
+            # Буфер заполнен: перезаписываем самое старое событие
+            self._slots[self._start] = event
+            self._start = (self._start + 1) % capacity
+
+    def last_id(self):
+        return self._at(self._size - 1)['id'] if self._size else 0
+
+    def _slice(self, lo, hi):
+        # Логический диапазон [lo, hi) не больше двух срезов физического списка
+        capacity = len(self._slots)
+        first, last = self._start + lo, self._start + hi
+        if last <= capacity:
+            return self._slots[first:last]
+        if first >= capacity:
+            return self._slots[first - capacity:last - capacity]
+        return self._slots[first:] + self._slots[:last - capacity]
+
+    def after(self, seq, limit=None):
+        """События с id больше seq"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._at(mid)['id'] <= seq:
+                lo = mid + 1
+            else:
+                hi = mid
+        end = self._size if limit is None else min(self._size, lo + limit)
+        return self._slice(lo, end)
+
+    def tail(self, count):
+        """Последние count событий"""
+        return self._slice(max(0, self._size - count), self._size)
+
+
+class InMemoryEventBus:
+    """Шина событий в памяти процесса (разработка, один воркер gunicorn)"""
+
+    def __init__(self, max_events_per_user=100, idle_ttl=3600.0):
+        self.max_events_per_user = max_events_per_user
+        self.idle_ttl = idle_ttl
+        # user_id -> EventRing, от давно неактивных к недавним
+        self._rings = OrderedDict()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._next_sweep = 0.0
+
+    def _touch(self, user_id, create=False):
+        # Вызывается под self._lock
+        now = time.monotonic()
+        ring = self._rings.get(user_id)
+        if ring is None:
+            if not create:
+                return None
+            ring = self._rings[user_id] = EventRing(self.max_events_per_user)
+        else:
+            self._rings.move_to_end(user_id)
+        ring.touched = now
+        if now >= self._next_sweep:
+            self._evict_idle(now)
+        return ring
+
+    def _evict_idle(self, now):
+        # Словарь упорядочен по времени обращения, поэтому смотрим только начало
+        rings = self._rings
+        while rings:
+            user_id = next(iter(rings))
+            if now - rings[user_id].touched < self.idle_ttl:
+                break
+            del rings[user_id]
+        self._next_sweep = now + min(self.idle_ttl / 10, 1.0)
+
+    def publish(self, user_id, event_type, data):
+        with self._lock:
+            event = {
+                'id': next(self._counter),
+                'type': event_type,
+                'data': data,
+                'timestamp': datetime.now().isoformat()
+            }
+            self._touch(user_id, create=True).append(event)
+            self._changed.notify_all()
+        return event
+
+    def publish_many(self, events):
+        """Опубликовать пачку событий (user_id, type, data) под одной блокировкой"""
+        published = []
+        with self._lock:
+            timestamp = datetime.now().isoformat()
+            for user_id, event_type, data in events:
+                event = {
+                    'id': next(self._counter),
+                    'type': event_type,
+                    'data': data,
+                    'timestamp': timestamp
+                }
+                self._touch(user_id, create=True).append(event)
+                published.append(event)
+            if published:
+                self._changed.notify_all()
+        return published
+
+    def read(self, user_id, after=None, limit=None):
+        """События пользователя с id больше after (или последние limit)"""
+        with self._lock:
+            ring = self._touch(user_id)
+            if ring is None:
+                return []
+            if after is None:
+                return ring.tail(limit or 10)
+            return ring.after(after, limit)
+
+    def last_id(self, user_id):
+        with self._lock:
+            ring = self._rings.get(user_id)
+            return ring.last_id() if ring else 0
+
+    def users(self):
+        with self._lock:
+            return len(self._rings)
+
+    def wait(self, user_id, after, timeout):
+        """Дождаться событий после курсора after, но не дольше timeout секунд"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                ring = self._touch(user_id)
+                if ring is not None and ring.last_id() > after:
+                    return ring.after(after)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._changed.wait(remaining)
+
+
+class SQLiteEventBus:
+    """Шина событий в SQLite-файле (WAL), общем для всех воркеров на машине"""
+
+    def __init__(self, path, max_events=100000, prune_every=1000, poll_interval=0.5):
+        self.path = path
+        self.max_events = max_events
+        self.prune_every = prune_every
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._published = itertools.count(1)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS realtime_event ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' user_id INTEGER NOT NULL,'
+                ' type TEXT NOT NULL,'
+                ' data TEXT NOT NULL,'
+                ' timestamp TEXT NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_realtime_event_user_id '
+                'ON realtime_event (user_id, id)'
+            )
+
+    def _connect(self):
+        # Соединение на поток: sqlite3 не разрешает делить его между потоками
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def publish(self, user_id, event_type, data):
+        conn = self._connect()
+        timestamp = datetime.now().isoformat()
+        cursor = conn.execute(
+            'INSERT INTO realtime_event (user_id, type, data, timestamp) VALUES (?, ?, ?, ?)',
+            (user_id, event_type, json.dumps(data, ensure_ascii=False), timestamp)
+        )
+        event_id = cursor.lastrowid
+        if next(self._published) % self.prune_every == 0:
+            self.prune()
+        return {'id': event_id, 'type': event_type, 'data': data, 'timestamp': timestamp}
+
+    def publish_many(self, events):
+        """Опубликовать пачку событий (user_id, type, data) одной транзакцией"""
+        conn = self._connect()
+        timestamp = datetime.now().isoformat()
+        published = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for user_id, event_type, data in events:
+                cursor = conn.execute(
+                    'INSERT INTO realtime_event (user_id, type, data, timestamp) VALUES (?, ?, ?, ?)',
+                    (user_id, event_type, json.dumps(data, ensure_ascii=False), timestamp)
+                )
+                published.append({'id': cursor.lastrowid, 'type': event_type,
+                                  'data': data, 'timestamp': timestamp})
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        due = [next(self._published) % self.prune_every == 0 for _ in published]
+        if any(due):
+            self.prune()
+        return published
+
+    def read(self, user_id, after=None, limit=None):
+        conn = self._connect()
+        if after is None:
+            rows = conn.execute(
+                'SELECT id, type, data, timestamp FROM realtime_event '
+                'WHERE user_id = ? ORDER BY id DESC LIMIT ?',
+                (user_id, limit or 10)
+            ).fetchall()
+            rows.reverse()
+        else:
+            rows = conn.execute(
+                'SELECT id, type, data, timestamp FROM realtime_event '
+                'WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (user_id, after, limit or -1)
+            ).fetchall()
+        return [
+            {'id': row[0], 'type': row[1], 'data': json.loads(row[2]), 'timestamp': row[3]}
+            for row in rows
+        ]
+
+    def last_id(self, user_id):
+        row = self._connect().execute(
+            'SELECT MAX(id) FROM realtime_event WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def wait(self, user_id, after, timeout):
+        """Дождаться событий после курсора after, но не дольше timeout секунд.
+
+        Пока файл не менялся (PRAGMA data_version), запрос к таблице не
+        выполняется, поэтому ожидание почти ничего не стоит.
+        """
+        deadline = time.monotonic() + timeout
+        conn = self._connect()
+        seen_version = None
+        while True:
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if version != seen_version:
+                seen_version = version
+                events = self.read(user_id, after=after)
+                if events:
+                    return events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(self.poll_interval, remaining))
+
+    def prune(self):
+        """Удалить самые старые события сверх max_events"""
+        self._connect().execute(
+            'DELETE FROM realtime_event WHERE id <= '
+            '(SELECT MAX(id) FROM realtime_event) - ?',
+            (self.max_events,)
+        )
+
+
+def format_sse(event):
+    """Событие в формате text/event-stream (тип события передается в data)"""
+    payload = json.dumps(event, ensure_ascii=False)
+    return f"id: {event['id']}\ndata: {payload}\n\n"
+
+
+def event_stream(bus, user_id, cursor, heartbeat=15.0, timeout=300.0, retry=3000):
+    """Генератор Server-Sent Events для пользователя начиная с курсора"""
+    yield f'retry: {retry}\n\n'
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events = bus.wait(user_id, cursor, min(heartbeat, remaining))
+        if not events:
+            yield ': heartbeat\n\n'
+            continue
+        for event in events:
+            cursor = event['id']
+            yield format_sse(event)
+
+
+def create_event_bus(app):
+    """Создать шину событий по настройке REALTIME_BACKEND (memory или sqlite)"""
+    app.config.setdefault('REALTIME_BACKEND', os.environ.get('REALTIME_BACKEND', 'memory'))
+    app.config.setdefault('REALTIME_DB_PATH', os.environ.get(
+        'REALTIME_DB_PATH', os.path.join(app.instance_path, 'realtime.db')))
+    app.config.setdefault('REALTIME_MAX_EVENTS_PER_USER', 100)
+    # Буферы пользователей без обращений дольше стольких секунд удаляются
+    app.config.setdefault('REALTIME_IDLE_TTL', 3600.0)
+    # Heartbeat не дает прокси закрыть SSE-соединение, а после STREAM_TIMEOUT
+    # браузер переподключается с заголовком Last-Event-ID
+    app.config.setdefault('REALTIME_HEARTBEAT', 15.0)
+    app.config.setdefault('REALTIME_STREAM_TIMEOUT', 300.0)
+    app.config.setdefault('REALTIME_LONGPOLL_TIMEOUT', 25.0)
+
+    backend = app.config['REALTIME_BACKEND']
+    if backend == 'memory':
+        bus = InMemoryEventBus(app.config['REALTIME_MAX_EVENTS_PER_USER'],
+                               app.config['REALTIME_IDLE_TTL'])
+    elif backend == 'sqlite':
+        bus = SQLiteEventBus(app.config['REALTIME_DB_PATH'])
+    else:
+        raise ValueError(f'Неизвестный REALTIME_BACKEND: {backend}')
+
+    app.extensions['event_bus'] = bus
+    return bus
@@ -0,0 +1,131 @@
+"""Сериализация строк SQLAlchemy в JSON-ответы API (orjson, если установлен)"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - необязательная зависимость
+    orjson = None
+
+from models import MenuItem, Order, OrderItem, User
+
+
+def format_datetime(value):
+    """Дата в формате '%d.%m.%Y %H:%M' без strftime"""
+    if value is None:
+        return None
+    return f'{value.day:02d}.{value.month:02d}.{value.year} {value.hour:02d}:{value.minute:02d}'
+
+
+def truncate(length):
+    """Обрезать строку до length символов с многоточием"""
+    def formatter(value):
+        if value and len(value) > length:
+            return value[:length] + '...'
+        return value
+    return formatter
+
+
+class Field:
+    def __init__(self, name, column, formatter=None):
+        self.name = name
+        self.column = column
+        self.formatter = formatter
+
+
+class Schema:
+    """Набор полей ответа с заранее скомпилированной функцией сериализации"""
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.dump = self._compile()
+
+    def columns(self):
+        """Колонки для select()/query() с метками по именам полей"""
+        return [field.column.label(field.name) for field in self.fields]
+
+    def _compile(self):
+        namespace = {}
+        items = []
+        for index, field in enumerate(self.fields):
+            value = f'row[{index}]'
+            if field.formatter is not None:
+                namespace[f'_f{index}'] = field.formatter
+                value = f'_f{index}({value})'
+            items.append(f'{field.name!r}: {value}')
+        source = f'def dump(row):\n    return {{{", ".join(items)}}}\n'
+        exec(compile(source, f'<schema {", ".join(f.name for f in self.fields)}>', 'exec'), namespace)
+        return namespace['dump']
+
+    def dump_rows(self, rows):
+        dump = self.dump
+        return [dump(row) for row in rows]
+
+
+ORDER_SUMMARY = Schema(
+    Field('id', Order.id),
+    Field('total_amount', Order.total_amount),
+    Field('status', Order.status),
+    Field('created_at', Order.created_at, format_datetime),
+    Field('items_count', Order.items_count),
+)
+
+ADMIN_ORDER_SUMMARY = Schema(
+    Field('id', Order.id),
+    Field('total_amount', Order.total_amount),
+    Field('status', Order.status),
+    Field('created_at', Order.created_at, format_datetime),
+    Field('items_count', Order.items_count),
+    Field('username', User.username),
+)
+
+USER_ORDER = Schema(
+    Field('id', Order.id),
+    Field('total_amount', Order.total_amount),
+    Field('status', Order.status),
+    Field('created_at', Order.created_at, format_datetime),
+    Field('delivery_address', Order.delivery_address),
+    Field('phone', Order.phone),
+    Field('items_count', Order.items_count),
+)
+
+ADMIN_ORDER = Schema(
+    Field('id', Order.id),
+    Field('username', User.username),
+    Field('total_amount', Order.total_amount),
+    Field('status', Order.status),
+    Field('created_at', Order.created_at, format_datetime),
+    Field('delivery_address', Order.delivery_address, truncate(50)),
+    Field('phone', Order.phone),
+)
+
+ORDER_ITEM = Schema(
+    Field('name', MenuItem.name),
+    Field('quantity', OrderItem.quantity),
+    Field('price', OrderItem.price_at_time),
+)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON-провайдер Flask на orjson (вызовы с доп. аргументами - стандартный провайдер)"""
+
+    def dumps(self, obj, **kwargs):
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        if kwargs:
+            return super().dumps(obj, sort_keys=sort_keys, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def install_json_provider(app):
+    """Подключить orjson, если он установлен. Возвращает имя кодировщика"""
+    if orjson is None or not app.config.get('JSON_USE_ORJSON', True):
+        return 'json'
+    app.json = OrjsonProvider(app)
+    return 'orjson'
@@ -248,7 +248,7 @@ function renderMenu(categories) {
         category.items.forEach(item => {
             html += `
                 <div class="menu-item">
-                    <div class="item-image" style="background-image: url('${item.image || '/static/images/default-dish.jpg'}')"></div>
+                    <div class="item-image" style="background-image: url('${item.thumbnail_url || '/static/images/default-dish.jpg'}')"></div>
                     <div class="item-info">
                         <h4>${item.name}</h4>
                         <p class="item-description">${item.description}</p>
@@ -0,0 +1,104 @@
+from datetime import date
+
+from sqlalchemy import delete, func, select
+
+from database import db, upsert_increment
+from models import Order, OrderStat
+
+ALL_TIME = 'all'
+
+
+def _bucket(day):
+    return day.isoformat()
+
+
+def _bump(deltas):
+    """Изменить счетчики {(bucket, status): (count_delta, revenue_delta)} в текущей транзакции"""
+    rows = [{'bucket': bucket, 'status': status, 'orders_count': count, 'revenue': revenue}
+            for (bucket, status), (count, revenue) in deltas.items()]
+    if rows:
+        upsert_increment(OrderStat, ('bucket', 'status'), ('orders_count', 'revenue'), rows)
+
+
+def record_order_created(order):
+    """Учесть новый заказ. Вызывать до commit() в той же транзакции"""
+    status = order.status or 'pending'
+    _bump({(bucket, status): (1, order.total_amount)
+           for bucket in (ALL_TIME, _bucket(order.created_at.date()))})
+
+
+def record_status_change(order, old_status, new_status):
+    """Перенести заказ между статусами. Вызывать до commit()"""
+    record_status_changes([(order, old_status, new_status)])
+
+
+def record_status_changes(changes):
+    """Перенести пачку заказов (order, old_status, new_status) между статусами.
+
+    Изменения суммируются по (bucket, status), поэтому на пачку приходится
+    один UPSERT по затронутым парам, а не по четыре на заказ.
+    """
+    deltas = {}
+    for order, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        for bucket in (ALL_TIME, _bucket(order.created_at.date())):
+            for status, sign in ((old_status, -1), (new_status, 1)):
+                count, revenue = deltas.get((bucket, status), (0, 0.0))
+                deltas[(bucket, status)] = (count + sign, revenue + sign * order.total_amount)
+
+    _bump({key: delta for key, delta in deltas.items() if any(delta)})
+
+
+def rebuild():
+    """Пересчитать все счетчики по таблице заказов и сохранить"""
+    db.session.execute(delete(OrderStat))
+
+    day = func.date(Order.created_at)
+    rows = db.session.execute(
+        select(day, Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0))
+        .group_by(day, Order.status)
+    ).all()
+
+    totals = {}
+    for day_value, status, orders_count, revenue in rows:
+        db.session.add(OrderStat(bucket=str(day_value), status=status,
+                                 orders_count=orders_count, revenue=revenue))
+        count_total, revenue_total = totals.get(status, (0, 0.0))
+        totals[status] = (count_total + orders_count, revenue_total + revenue)
+
+    for status, (orders_count, revenue) in totals.items():
+        db.session.add(OrderStat(bucket=ALL_TIME, status=status,
+                                 orders_count=orders_count, revenue=revenue))
+    db.session.commit()
+    return len(rows)
+
+
+def is_empty():
+    return db.session.execute(select(OrderStat.bucket).limit(1)).first() is None
+
+
+def snapshot(today=None):
+    """Статистика для панели администратора: читает только строки 'all' и текущего дня"""
+    today_bucket = _bucket(today or date.today())
+    rows = db.session.execute(
+        select(OrderStat.bucket, OrderStat.status, OrderStat.orders_count, OrderStat.revenue)
+        .where(OrderStat.bucket.in_((ALL_TIME, today_bucket)))
+    ).all()
+
+    stats = {
+        'total_orders': 0,
+        'pending_orders': 0,
+        'today_orders': 0,
+        'total_revenue': 0.0,
+    }
+    for bucket, status, orders_count, revenue in rows:
+        if bucket == ALL_TIME:
+            stats['total_orders'] += orders_count
+            stats['total_revenue'] += revenue
+            if status == 'pending':
+                stats['pending_orders'] += orders_count
+        else:
+            stats['today_orders'] += orders_count
+    stats['total_revenue'] = float(round(stats['total_revenue'], 2))
+    return stats
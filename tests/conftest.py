@@ -0,0 +1,68 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, init_db
+from database import db
+from models import MenuItem, Order, OrderItem, User
+import stats
+
+# Заказов на каждого тестового пользователя: N+1 на таком объеме сразу
+# выходит за лимит запросов
+ORDERS_PER_USER = 30
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('db') / 'test.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        # Тестам не нужна стойкость хеша, а 600000 итераций на вход - это секунды
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGEVIEW_TRACKING': False,
+        'QUERY_BUDGET_CHECK': True,
+        'QUERY_BUDGET_STRICT': True,
+    })
+    with app.app_context():
+        init_db()
+        seed_orders(ORDERS_PER_USER)
+    return app
+
+
+def seed_orders(per_user):
+    """Заказы по три позиции каждому пользователю, по одному в минуту"""
+    menu = MenuItem.query.order_by(MenuItem.id).all()
+    start = datetime.utcnow() - timedelta(days=1)
+    for user in User.query.order_by(User.id):
+        for n in range(per_user):
+            created_at = start + timedelta(minutes=n)
+            items = [menu[(n + k) % len(menu)] for k in range(3)]
+            order = Order(user_id=user.id, status='pending', created_at=created_at,
+                          updated_at=created_at,
+                          total_amount=sum(item.price for item in items))
+            order.items = [OrderItem(menu_item_id=item.id, quantity=1, price_at_time=item.price)
+                           for item in items]
+            db.session.add(order)
+    db.session.commit()
+    stats.rebuild()
+
+
+def login(client, username, password):
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app.test_client(), 'admin', 'admin123')
+
+
+@pytest.fixture
+def user_client(app):
+    return login(app.test_client(), 'user', 'user123')
@@ -0,0 +1,32 @@
+from app import create_app, init_db
+from database import db
+from models import MenuItem
+
+
+def make_app(tmp_path, name):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / name}.db',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGEVIEW_TRACKING': False,
+    })
+    with app.app_context():
+        init_db()
+    return app
+
+
+def test_apps_do_not_share_state(tmp_path):
+    first, second = make_app(tmp_path, 'first'), make_app(tmp_path, 'second')
+    for key in ('pageviews', 'menu_catalog', 'user_cache', 'credentials',
+                'fragment_cache', 'assets', 'metrics', 'admin_recipients', 'event_bus'):
+        assert first.extensions[key] is not second.extensions[key], key
+
+    # Меню первого приложения закэшировано до изменения во втором
+    assert 'Брускетта' in first.test_client().get('/api/menu').get_data(as_text=True)
+    with second.app_context():
+        db.session.get(MenuItem, 1).name = 'Брускетта с томатами'
+        db.session.commit()
+
+    assert 'Брускетта с томатами' in second.test_client().get('/api/menu').get_data(as_text=True)
+    assert 'Брускетта с томатами' not in first.test_client().get('/api/menu').get_data(as_text=True)
+    assert 'Брускетта с томатами' not in first.test_client().get('/menu').get_data(as_text=True)
@@ -0,0 +1,31 @@
+import os
+import shutil
+
+from app import create_app
+from assets import MANIFEST_NAME, build_assets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_only_fingerprinted_files_are_served(tmp_path):
+    static = tmp_path / 'static'
+    shutil.copytree(os.path.join(ROOT, 'static', 'css'), static / 'css')
+    app = create_app({'TESTING': True, 'PAGEVIEW_TRACKING': False,
+                      'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/assets.db'})
+    app.static_folder = str(static)
+    build_assets(app)
+    assets = app.extensions['assets']
+    assets.output_dir = str(static / 'dist')
+    assert assets.load()
+
+    client = app.test_client()
+    response = client.get(assets.url('css/style.css'))
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+
+    assert (static / 'dist' / MANIFEST_NAME).is_file()
+    assert client.get(f'/static/dist/{MANIFEST_NAME}').status_code == 404
+    # Исходное имя без хеша из каталога сборки тоже не отдается
+    os.makedirs(static / 'dist' / 'css', exist_ok=True)
+    shutil.copy(static / 'css' / 'style.css', static / 'dist' / 'css' / 'style.css')
+    assert client.get('/static/dist/css/style.css').status_code == 404
@@ -0,0 +1,51 @@
+from werkzeug.security import generate_password_hash
+
+from credentials import credentials
+from database import db
+from models import User
+
+OLD_METHOD = 'pbkdf2:sha256:500'
+
+
+def add_user(app, username, password):
+    with app.app_context():
+        user = User(username=username, email=f'{username}@gurman.by',
+                    password=generate_password_hash(password, OLD_METHOD))
+        db.session.add(user)
+        db.session.commit()
+        return user.id, user.password
+
+
+def stored_hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password
+
+
+def test_login_rehashes_old_parameters(app):
+    user_id, old_hash = add_user(app, 'legacy', 'secret')
+    with app.app_context():
+        assert credentials.needs_rehash(old_hash)
+
+    response = app.test_client().post('/login', data={'username': 'legacy', 'password': 'secret'})
+    assert response.status_code == 302
+
+    new_hash = stored_hash(app, user_id)
+    assert new_hash.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    with app.app_context():
+        assert not credentials.needs_rehash(new_hash)
+    # С новым хешем вход по-прежнему работает
+    response = app.test_client().post('/login', data={'username': 'legacy', 'password': 'secret'})
+    assert response.status_code == 302
+
+
+def test_failed_login_keeps_hash(app):
+    user_id, old_hash = add_user(app, 'legacy-failed', 'secret')
+    response = app.test_client().post('/login', data={'username': 'legacy-failed', 'password': 'wrong'})
+    assert response.status_code == 200
+    assert stored_hash(app, user_id) == old_hash
+
+
+def test_verify_unknown_user(app):
+    with app.app_context():
+        assert credentials.verify(None, 'secret') is False
+        assert credentials.verify(None, '') is False
@@ -0,0 +1,28 @@
+from app import create_app, init_db
+from conftest import login
+from database import dispose_engines, pool_metrics
+
+
+def test_pool_metrics_survive_dispose(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/pool.db',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGEVIEW_TRACKING': False,
+    })
+    with app.app_context():
+        init_db()
+        checkouts = pool_metrics()['default']['checkouts']
+
+    # Так воркер gunicorn сбрасывает унаследованные после fork() пулы
+    dispose_engines(app, close=False)
+    with app.app_context():
+        engines = pool_metrics()
+    assert engines['default']['checkouts'] == checkouts
+    assert 'read' in engines
+
+    admin = login(app.test_client(), 'admin', 'admin123')
+    response = admin.get('/api/admin/db/pool')
+    assert response.status_code == 200
+    assert response.json['engines']['default']['checkouts'] > checkouts
+    assert 'db_pool' in app.test_client().get('/metrics').get_data(as_text=True)
@@ -0,0 +1,17 @@
+from database import db
+from models import MenuItem
+
+
+def test_profile_orders_follow_menu_changes(app, user_client):
+    assert 'Брускетта' in user_client.get('/profile/orders').get_data(as_text=True)
+
+    with app.app_context():
+        item = db.session.get(MenuItem, 1)
+        item.name = 'Брускетта с томатами'
+        db.session.commit()
+    try:
+        assert 'Брускетта с томатами' in user_client.get('/profile/orders').get_data(as_text=True)
+    finally:
+        with app.app_context():
+            db.session.get(MenuItem, 1).name = 'Брускетта'
+            db.session.commit()
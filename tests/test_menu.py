@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from app import create_app, init_db
+from database import db
+from models import Category, MenuItem
+
+
+def make_app(path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGEVIEW_TRACKING': False,
+    })
+    with app.app_context():
+        init_db()
+    return app
+
+
+def test_last_modified_comes_from_menu_data(tmp_path):
+    # Два приложения на одной базе - как два воркера
+    first, second = make_app(tmp_path / 'menu.db'), make_app(tmp_path / 'menu.db')
+    with first.app_context():
+        changed_at = datetime(2024, 5, 1, 12, 0, 0)
+        for model in (Category, MenuItem):
+            db.session.execute(db.update(model).values(updated_at=changed_at))
+        db.session.commit()
+
+    response = first.test_client().get('/api/menu')
+    assert response.last_modified.replace(tzinfo=None) == changed_at
+    assert second.test_client().get('/api/menu').last_modified == response.last_modified
+
+    # Перестроение снимка без изменений меню не сдвигает Last-Modified
+    with first.app_context():
+        first.extensions['menu_catalog'].invalidate()
+    client = first.test_client()
+    assert client.get('/api/menu').last_modified == response.last_modified
+    revalidated = client.get('/api/menu', headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert revalidated.status_code == 304
+
+
+def test_last_modified_advances_when_menu_changes(tmp_path):
+    app = make_app(tmp_path / 'menu.db')
+    with app.app_context():
+        long_ago = datetime.utcnow() - timedelta(days=1)
+        for model in (Category, MenuItem):
+            db.session.execute(db.update(model).values(updated_at=long_ago))
+        db.session.commit()
+    client = app.test_client()
+    before = client.get('/api/menu').last_modified
+
+    with app.app_context():
+        db.session.get(MenuItem, 1).price = 13.0
+        db.session.commit()
+    after_update = client.get('/api/menu').last_modified
+    assert after_update > before
+
+    # Удаление не меняет max(updated_at), но ответ все равно не должен быть 304
+    with app.app_context():
+        db.session.execute(db.update(MenuItem).values(updated_at=long_ago))
+        db.session.delete(db.session.get(MenuItem, 2))
+        db.session.commit()
+    response = client.get('/api/menu', headers={'If-Modified-Since': before.strftime('%a, %d %b %Y %H:%M:%S GMT')})
+    assert response.status_code == 200
+    assert response.last_modified > before
@@ -0,0 +1,61 @@
+"""Опрос изменений заказов по курсору since (X-Changes-Cursor)."""
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from database import db
+from models import Order
+
+
+def poll(client, cursor):
+    response = client.get(f'/api/admin/orders/update?since={cursor}')
+    return response, response.headers['X-Changes-Cursor']
+
+
+def test_polling_passes_more_than_limit_rows_with_one_timestamp(app, admin_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'ORDER_CHANGES_LIMIT', 20)
+    cursor = admin_client.get('/api/admin/orders/update').headers['X-Changes-Cursor']
+
+    # Пакетная смена статусов: у всех заказов одинаковый updated_at внутри
+    # окна перекрытия, а после них - еще одно изменение
+    changed_at = datetime.utcnow()
+    with app.app_context():
+        total = db.session.scalar(select(db.func.count(Order.id)))
+        later_id = db.session.scalar(select(db.func.min(Order.id)))
+        db.session.execute(update(Order).values(updated_at=changed_at))
+        db.session.execute(update(Order).where(Order.id == later_id)
+                           .values(status='ready', updated_at=changed_at + timedelta(milliseconds=1)))
+        db.session.commit()
+
+    seen = {}
+    for _ in range(10):
+        response, cursor = poll(admin_client, cursor)
+        assert response.status_code == 200
+        seen.update((order['id'], order['status']) for order in response.json)
+        if seen.get(later_id) == 'ready':
+            break
+    assert seen.get(later_id) == 'ready'
+    assert len(seen) == total
+
+
+def test_polling_goes_quiet_after_overlap(app, admin_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'ORDER_CHANGES_OVERLAP', 0.2)
+    with app.app_context():
+        db.session.execute(update(Order).values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+    cursor = admin_client.get('/api/admin/orders/update').headers['X-Changes-Cursor']
+    with app.app_context():
+        order_id = db.session.scalar(select(db.func.max(Order.id)))
+        db.session.execute(update(Order).where(Order.id == order_id)
+                           .values(status='preparing', updated_at=datetime.utcnow()))
+        db.session.commit()
+
+    response, cursor = poll(admin_client, cursor)
+    assert [order['id'] for order in response.json] == [order_id]
+    # Внутри окна перекрытия изменение приходит повторно, потом - 204
+    time.sleep(0.3)
+    response, cursor = poll(admin_client, cursor)
+    assert response.status_code == 200 and [order['id'] for order in response.json] == [order_id]
+    response, cursor = poll(admin_client, cursor)
+    assert response.status_code == 204
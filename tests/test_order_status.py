@@ -0,0 +1,149 @@
+import pytest
+from sqlalchemy import update
+
+from app import create_app, init_db
+from conftest import login
+from database import db
+from models import Order
+import order_status
+
+
+@pytest.fixture(scope='module')
+def shop(tmp_path_factory):
+    """Отдельная база: тесты меняют статусы заказов"""
+    path = tmp_path_factory.mktemp('db') / 'orders.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGEVIEW_TRACKING': False,
+    })
+    with app.app_context():
+        init_db()
+    return app
+
+
+@pytest.fixture
+def admin(shop):
+    return login(shop.test_client(), 'admin', 'admin123')
+
+
+def create_orders(app, count):
+    client = login(app.test_client(), 'user', 'user123')
+    return [client.post('/order', json={'items': [{'id': 1, 'quantity': 1}]}).json['order_id']
+            for _ in range(count)]
+
+
+def statuses(app, order_ids):
+    with app.app_context():
+        return [db.session.get(Order, order_id).status for order_id in order_ids]
+
+
+def events(app, user_id, after):
+    return app.extensions['event_bus'].read(user_id, after=after)
+
+
+@pytest.mark.parametrize('path', [
+    ['preparing', 'ready', 'delivered'],
+    ['cancelled', 'pending', 'ready'],
+    ['ready', 'preparing', 'pending'],
+])
+def test_allowed_transitions(shop, admin, path):
+    order_id, = create_orders(shop, 1)
+    for status in path:
+        response = admin.post(f'/admin/order/{order_id}/status', json={'status': status})
+        assert response.status_code == 200
+    assert statuses(shop, [order_id]) == [path[-1]]
+
+
+@pytest.mark.parametrize('path, rejected', [
+    (['preparing', 'ready', 'delivered'], 'pending'),
+    (['cancelled'], 'ready'),
+    ([], 'delivered'),
+])
+def test_rejected_transitions(shop, admin, path, rejected):
+    order_id, = create_orders(shop, 1)
+    for status in path:
+        admin.post(f'/admin/order/{order_id}/status', json={'status': status})
+    response = admin.post(f'/admin/order/{order_id}/status', json={'status': rejected})
+    assert response.status_code == 400
+    assert statuses(shop, [order_id]) == [path[-1] if path else 'pending']
+
+
+def test_unknown_status_and_order(shop, admin):
+    order_id, = create_orders(shop, 1)
+    assert admin.post(f'/admin/order/{order_id}/status', json={'status': 'lost'}).status_code == 400
+    assert admin.post('/admin/order/999999/status', json={'status': 'ready'}).status_code == 404
+
+
+def test_stale_status_is_a_conflict(shop, admin, monkeypatch):
+    order_id, = create_orders(shop, 1)
+    can_transition = order_status.can_transition
+
+    def changed_meanwhile(old_status, new_status):
+        # Другой администратор успел сменить статус между SELECT и UPDATE
+        with db.engine.begin() as conn:
+            conn.execute(update(Order).where(Order.id == order_id).values(status='cancelled'))
+        return can_transition(old_status, new_status)
+
+    monkeypatch.setattr(order_status, 'can_transition', changed_meanwhile)
+    response = admin.post(f'/admin/order/{order_id}/status', json={'status': 'preparing'})
+    assert response.status_code == 409
+    assert response.json['error'] == order_status.StatusConflict().message
+    assert statuses(shop, [order_id]) == ['cancelled']
+
+
+def test_batch_is_all_or_nothing(shop, admin):
+    first, second = create_orders(shop, 2)
+    response = admin.post('/admin/orders/status', json={'changes': [
+        {'order_id': first, 'status': 'preparing'},
+        {'order_id': second, 'status': 'delivered'},
+    ]})
+    assert response.status_code == 400
+    assert response.json['updated'] == []
+    assert [e['order_id'] for e in response.json['errors']] == [second]
+    assert statuses(shop, [first, second]) == ['pending', 'pending']
+
+
+def test_partial_batch_applies_valid_changes(shop, admin):
+    first, second, third = create_orders(shop, 3)
+    response = admin.post('/admin/orders/status', json={'changes': [
+        {'order_id': first, 'status': 'preparing'},
+        {'order_id': second, 'status': 'delivered'},
+        {'order_id': third, 'status': 'cancelled'},
+        {'order_id': third, 'status': 'ready'},
+    ], 'partial': True})
+    assert response.status_code == 200
+    assert response.json['success'] is False
+    assert response.json['updated'] == [first, third]
+    assert sorted(e['order_id'] for e in response.json['errors']) == [second, third]
+    assert statuses(shop, [first, second, third]) == ['preparing', 'pending', 'cancelled']
+
+
+def test_change_publishes_event_and_notification(shop, admin):
+    first, second = create_orders(shop, 2)
+    with shop.app_context():
+        user_id = db.session.get(Order, first).user_id
+    after = shop.extensions['event_bus'].last_id(user_id)
+
+    admin.post('/admin/orders/status', json={'changes': [
+        {'order_id': first, 'status': 'ready'},
+        {'order_id': second, 'status': 'cancelled'},
+    ]})
+    published = events(shop, user_id, after)
+    assert [(e['type'], e['data']['order_id'], e['data']['status']) for e in published] == [
+        ('order_status_changed', first, 'ready'),
+        ('order_status_changed', second, 'cancelled'),
+    ]
+    assert all(e['data']['status_text'] for e in published)
+
+    # Клиент пользователя получает те же события через API обновлений
+    client = login(shop.test_client(), 'user', 'user123')
+    updates = client.get(f'/api/realtime/updates?cursor={after}').json['updates']
+    assert [u['id'] for u in updates] == [e['id'] for e in published]
+
+    # Отклоненное или повторное изменение событий не публикует
+    after = published[-1]['id']
+    admin.post(f'/admin/order/{first}/status', json={'status': 'ready'})
+    admin.post(f'/admin/order/{second}/status', json={'status': 'delivered'})
+    assert events(shop, user_id, after) == []
@@ -0,0 +1,26 @@
+import pytest
+
+from database import db
+from models import Order
+from pagination import keyset_page
+
+
+@pytest.mark.parametrize('limit', [0, -5])
+def test_keyset_page_without_rows(app, limit):
+    with app.app_context():
+        assert keyset_page(db.session.query(Order), Order.created_at, Order.id, None, limit) == ([], None)
+
+
+@pytest.mark.parametrize('limit', [0, -5])
+def test_admin_orders_update_clamps_limit(admin_client, limit):
+    response = admin_client.get(f'/api/admin/orders/update?limit={limit}')
+    assert response.status_code == 200
+    assert len(response.json) == 1
+    assert 'X-Next-Cursor' in response.headers
+
+
+def test_admin_orders_pages_do_not_overlap(admin_client):
+    first = admin_client.get('/api/admin/orders/update?limit=25')
+    second = admin_client.get(f"/api/admin/orders/update?limit=25&before={first.headers['X-Next-Cursor']}")
+    both = admin_client.get('/api/admin/orders/update?limit=50')
+    assert [order['id'] for order in first.json + second.json] == [order['id'] for order in both.json]
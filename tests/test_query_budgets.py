@@ -0,0 +1,53 @@
+"""Лимиты SQL-запросов на списках заказов: N+1 ломает эти тесты.
+
+Представления проверяются дважды: декоратором query_budget в строгом
+режиме (QUERY_BUDGET_STRICT) и assert_max_queries на весь запрос, включая
+загрузку пользователя и middleware. Первый запрос прогревает кэши.
+"""
+import pytest
+
+from querycount import assert_max_queries
+from conftest import ORDERS_PER_USER
+
+
+def get_within_budget(client, url, max_queries):
+    client.get(url)
+    with assert_max_queries(max_queries):
+        response = client.get(url)
+    assert response.status_code == 200
+    return response
+
+
+@pytest.mark.parametrize('client_name', ['user_client', 'admin_client'])
+def test_latest_orders(request, client_name):
+    client = request.getfixturevalue(client_name)
+    response = get_within_budget(client, '/api/orders/latest?limit=20', 1)
+    assert len(response.json) == 20
+
+
+def test_user_orders_update(user_client):
+    response = get_within_budget(user_client, '/api/user/orders/update', 2)
+    orders = response.json
+    assert len(orders) == 20
+    assert all(len(order['items']) == 3 for order in orders)
+
+
+def test_user_orders_update_since(user_client):
+    cursor = user_client.get('/api/user/orders/update').headers['X-Changes-Cursor']
+    get_within_budget(user_client, f'/api/user/orders/update?since={cursor}', 2)
+
+
+def test_admin_orders_update(admin_client):
+    response = get_within_budget(admin_client, '/api/admin/orders/update?limit=100', 1)
+    assert len(response.json) == 2 * ORDERS_PER_USER
+
+
+def test_admin_orders_update_since(admin_client):
+    cursor = admin_client.get('/api/admin/orders/update').headers['X-Changes-Cursor']
+    get_within_budget(admin_client, f'/api/admin/orders/update?since={cursor}', 1)
+
+
+def test_admin_orders_page(admin_client):
+    response = get_within_budget(admin_client, '/admin/orders', 2)
+    # Имена клиентов берутся из joinedload, а не запросом на каждую строку
+    assert b'user' in response.data
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.mark.parametrize('timeout', ['nan', 'inf', '-inf'])
+def test_poll_rejects_non_finite_timeout(user_client, timeout):
+    response = user_client.get(f'/api/realtime/poll?timeout={timeout}')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('timeout', ['-5', '0'])
+def test_poll_returns_at_once_for_non_positive_timeout(user_client, timeout):
+    response = user_client.get(f'/api/realtime/poll?timeout={timeout}')
+    assert response.status_code == 200
+    assert response.json['updates'] == []
@@ -0,0 +1,55 @@
+from app import create_app, init_db
+from conftest import login
+from database import db
+from models import Order, OrderStat
+import stats
+
+
+def counters():
+    """Ненулевые счетчики {(bucket, status): (orders_count, revenue)}"""
+    return {(row.bucket, row.status): (row.orders_count, round(row.revenue, 2))
+            for row in db.session.query(OrderStat)
+            if row.orders_count or round(row.revenue, 2)}
+
+
+def test_counters_match_rebuild(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/stats.db',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGEVIEW_TRACKING': False,
+    })
+    with app.app_context():
+        init_db()
+
+    user = login(app.test_client(), 'user', 'user123')
+    order_ids = []
+    for n in range(6):
+        response = user.post('/order', json={'items': [{'id': 1 + n % 3, 'quantity': 1 + n},
+                                                       {'id': 4, 'quantity': 2}]})
+        assert response.status_code == 200
+        order_ids.append(response.json['order_id'])
+
+    admin = login(app.test_client(), 'admin', 'admin123')
+    response = admin.post('/admin/orders/status', json={'changes': [
+        {'order_id': order_ids[0], 'status': 'preparing'},
+        {'order_id': order_ids[1], 'status': 'preparing'},
+        {'order_id': order_ids[2], 'status': 'cancelled'},
+    ]})
+    assert response.status_code == 200
+    response = admin.post('/admin/orders/status', json={'changes': [
+        {'order_id': order_ids[0], 'status': 'ready'},
+        {'order_id': order_ids[1], 'status': 'cancelled'},
+        {'order_id': order_ids[2], 'status': 'pending'},
+        # Недопустимый переход: с partial остальные изменения применяются
+        {'order_id': order_ids[3], 'status': 'delivered'},
+    ], 'partial': True})
+    assert response.json['updated'] == order_ids[:3]
+
+    with app.app_context():
+        incremental = counters()
+        assert incremental[(stats.ALL_TIME, 'pending')][0] == 4
+        assert sum(count for (bucket, _), (count, _) in incremental.items()
+                   if bucket == stats.ALL_TIME) == Order.query.count()
+        stats.rebuild()
+        assert counters() == incremental
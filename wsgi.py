@@ -1,10 +1,16 @@
-from app import app, init_db
+import os
 
-# Инициализация базы данных при запуске
-print("Инициализация базы данных...")
-with app.app_context():
-    init_db()
-print("База данных инициализирована")
+from app import bootstrap_db, create_app
+
+app = create_app()
+
+# Схему и тестовые данные готовит `flask init-db` при деплое. Если он не
+# запускался, база инициализируется здесь; для готовой базы это один SELECT
+# по отметке версии. Под gunicorn с gunicorn.conf.py проверка выполняется
+# один раз в мастере, а не в каждом воркере
+if os.environ.get('INIT_DB_ON_IMPORT', '1') == '1':
+    with app.app_context():
+        bootstrap_db()
 
 if __name__ == '__main__':
     app.run()